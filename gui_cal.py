@@ -3,6 +3,7 @@ import sys
 import time
 import traceback
 from datetime import datetime
+from functools import partial
 from multiprocessing import Manager
 from os import system
 import threading
@@ -15,9 +16,11 @@ from src.initialise_station_configs import STATION_NAME, LOG_Pl_FOLDER, \
 from src.station_equipment import OpticalInstrumentsLock
 from gui_settings.setup_logging import start_logging_thread
 from src.common_functions import set_console_position, UserDict, load_yaml_file
-from src.path_lost_sequence import wait_time, osx_set_channel, read_opm_on_port, \
-    crp_get_data, tosa_path_los, read_wlm_on_port, collect_data, setup_instrument_config, plot_by_data, \
-    load_limit, power_laser_check
+from src.sequence_engine import SequenceEngine
+from src.path_lost_sequence import wait_time, read_bay_on_port, \
+    crp_get_data, tosa_path_los, collect_data, setup_instrument_config, plot_by_data, \
+    load_limit, power_laser_check, start_run, checkpoint_available, crp_checkpointed, bay_checkpointed, \
+    log_settle_stats
 from src.ask_question import display_img, IMG_PATH
 
 
@@ -25,20 +28,11 @@ SW_VERSION = '2.0'
 user_dict = UserDict.keys_user
 user_dict['Bay_Available'] = load_yaml_file(TOSA_BAY_MAP)['bay_map']
 
-class CaseTest:
-    func = []
-    seq_name_list = []
-    kwargs = []
-    trigger = []
-
-    def __init__(self):
-        pass
-
-    def add_step(self, func, name, kwargs=None, trigger=False):
-        self.func.append(func)
-        self.seq_name_list.append(name)
-        self.kwargs.append(kwargs)
-        self.trigger.append(trigger)
+# Resources serialized by the sequence engine
+OPERATOR = 'operator'
+OPM = 'OPM'
+WLM = 'WLM'
+OSW = 'OSW'
 
 
 class WorkerSignals(QObject):
@@ -145,16 +139,13 @@ class TestLED(QFrame):
 
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, case: SequenceEngine):
         super().__init__()
         # Initialise all gui features
 
         self.result = []
-        self.case = CaseTest()
-        self.func = self.case.func
-        self.seq_name_list = self.case.seq_name_list
-        self.kwargs = self.case.kwargs
-        self.trigger = self.case.trigger
+        self.case = case
+        self.seq_name_list = self.case.names
 
         self.check_test_equipment_button = QPushButton("Check Test Equipment")
         self.led_grid = QGridLayout()
@@ -162,6 +153,7 @@ class MainWindow(QMainWindow):
         # self.check_tosa_bays_button = QPushButton("Path Loss Calibration")
         self.crp_label = QLabel("dB")
         self.start_button = QPushButton("Start Path Loss")
+        self.resume_box = QCheckBox("Resume")
         self.abort_button = QPushButton("Abort")
         self.log_text_edit = QTextEdit()
         self.operator_input = QLineEdit()
@@ -187,7 +179,6 @@ class MainWindow(QMainWindow):
         self.lock = threading.Lock()
         self.label_list = []
         user_dict['Bay ID'] = 0
-        user_dict['Label_count'] = 0
         # lcf
         self.lcf = QComboBox()
         # start call per board
@@ -244,12 +235,6 @@ class MainWindow(QMainWindow):
         self.setup_ui()
         self.setup_console()
 
-    def add_step(self, func, name, kwargs=None):
-
-        self.func.append(func)
-        self.seq_name_list.append(name)
-        self.kwargs.append(kwargs)
-
     def log_message(self, message):
         logging.info(message)
         # time_now = time.strftime('%Y-%m-%d_%H:%M:%S')
@@ -314,6 +299,10 @@ class MainWindow(QMainWindow):
         self.abort_button.setEnabled(False)
         timer_layout.addWidget(self.abort_button)
 
+        self.resume_box.setToolTip("Resume the previous unfinished run from its checkpoint")
+        self.resume_box.setEnabled(checkpoint_available())
+        timer_layout.addWidget(self.resume_box)
+
         self.crp_label.setStyleSheet("QLabel{font-size: 16pt; background-color: white; border: 1px solid black;}")
         self.crp_label.setAlignment(Qt.AlignCenter)
         self.crp_label.setFixedSize(240, 40)
@@ -386,6 +375,9 @@ class MainWindow(QMainWindow):
         self.operator_input.setEnabled(False)
         self.start_button.setEnabled(False)
         self.abort_button.setEnabled(True)
+        self.resume_box.setEnabled(False)
+        user_dict['Bay ID'] = 0
+        start_run(resume=self.resume_box.isChecked())  # also resets the results of the previous run
 
         work = Worker(self.start_cal_seq)
         work.signals.progress.connect(self.running_path_loss_cal)
@@ -403,18 +395,21 @@ class MainWindow(QMainWindow):
         logging.info("End Sequence")
         self.start_button.setEnabled(True)
         self.abort_button.setEnabled(False)
+        self.resume_box.setChecked(False)
+        self.resume_box.setEnabled(checkpoint_available())
+
+    def ret_start_seq(self, index):
+        self.label_list[index].running()
 
-    def ret_finish_seq(self):
-        if False in self.result:
+    def ret_finish_seq(self, index, passed):
+        if user_dict['CRP(dB)'] is not None:
+            self.crp_label.setText(f"{user_dict['CRP(dB)']} dB")
+        if not passed:
             user_dict['fail'] = True
-        if self.abort is True or self.result[user_dict['Label_count']] is False or False in self.result:
-            self.label_list[user_dict['Label_count']].failed()
+        if self.abort is True or not passed:
+            self.label_list[index].failed()
         else:
-            self.label_list[user_dict['Label_count']].passed()
-
-        if user_dict['Label_count'] != (len(self.label_list) - 1):
-            self.label_list[user_dict['Label_count'] + 1].running()
-        user_dict['Label_count'] += 1
+            self.label_list[index].passed()
 
     def finish_path_loss_cal(self):
         to_sa_bay = user_dict['Bay ID']
@@ -436,25 +431,9 @@ class MainWindow(QMainWindow):
         self.leds[to_sa_bay // 7][to_sa_bay % 1].running()
 
     def start_cal_seq(self, progress_callback=None):
-        for ite in range(len(self.func)):
-            if user_dict['CRP(dB)'] is not None:
-                self.crp_label.setText(f"{user_dict['CRP(dB)']} dB")
-            if self.abort is False:
-                time.sleep(0.01)
-                try:
-                    if self.kwargs[ite] is None:
-                        self.func[ite]()
-                    else:
-                        self.func[ite](**self.kwargs[ite])
-
-                    self.result.append(True)
-                except Exception as e:
-                    logging.error(e)
-                    self.result.append(False)
-
-            else:
-                self.result.append(False)
-            self.ret_finish_seq()
+        self.result = self.case.run(abort=lambda: self.abort,
+                                    on_start=self.ret_start_seq,
+                                    on_finish=self.ret_finish_seq)
 
     def setup_calibration_path_loss_log(self):
         # Ensure Log & Data folders exist
@@ -586,48 +565,69 @@ def main():
     # load bay config
     bay = load_yaml_file(TOSA_BAY_MAP)
     app = QApplication(sys.argv)
-    case = CaseTest()
+    case = SequenceEngine()
     # sequence measure reference power
-    case.add_step(load_limit, name="Initial Station")
-    case.add_step(display_img, name="Turn On Laser Source Module",
-                  kwargs={"question": "Turn On Laser Source Module",
-                          'picture': IMG_PATH.joinpath('LS_module.JPG')})
+    # instrument setup and limit loading do not need the operator and run alongside the first prompts
+    limit = case.add_step(load_limit, name="Initial Station", depends=())
+    setup = case.add_step(setup_instrument_config, name="Setup Instrument", depends=(), resources=(OPM, WLM, OSW))
+    step = case.add_step(display_img, name="Turn On Laser Source Module",
+                         kwargs={"question": "Turn On Laser Source Module",
+                                 'picture': IMG_PATH.joinpath('LS_module.JPG')},
+                         depends=(), resources=(OPERATOR,))
     case.add_step(display_img, name="Turn On Laser Source Application",
                   kwargs={"question": "Turn On Laser Source Application",
-                          'picture': IMG_PATH.joinpath('LS_cont.JPG')})
-    case.add_step(wait_time, name="Wait for Laser Source Stable 15 minutes", kwargs={'wait': 0})  # stable 15
-    case.add_step(display_img, name="Connect Power Meter With LC line to Calibration",
-                  kwargs={"question": "Connect Power Meter With LC line to Calibration",
-                          'picture': IMG_PATH.joinpath('PWM_LC.JPG')})
-    case.add_step(setup_instrument_config, name="Setup Instrument")
-    case.add_step(crp_get_data, name="Read CRP (Calibration reference power)")
+                          'picture': IMG_PATH.joinpath('LS_cont.JPG')},
+                  depends=[step], resources=(OPERATOR,))
+    # a resumed run reuses the stored CRP and skips its measurement set-up
+    case.add_step(wait_time, name="Wait for Laser Source Stable 15 minutes", kwargs={'wait': 0},  # stable 15
+                  skip=crp_checkpointed)
+    step = case.add_step(display_img, name="Connect Power Meter With LC line to Calibration",
+                         kwargs={"question": "Connect Power Meter With LC line to Calibration",
+                                 'picture': IMG_PATH.joinpath('PWM_LC.JPG')},
+                         resources=(OPERATOR,), skip=crp_checkpointed)
+    crp = case.add_step(crp_get_data, name="Read CRP (Calibration reference power)",
+                        depends=[limit, setup, step], resources=(OPM,))
     case.add_step(display_img, name="Disconnect LC Cable and use for calibration",
                   kwargs={"question": "Disconnect LC Cable and use for calibration",
-                          'picture': IMG_PATH.joinpath('PWM_LC.JPG')})
-    case.add_step(display_img, name="Connect Power Meter FC line back to OPM",
-                  kwargs={"question": "Connect Power Meter FC line back to OPM",
-                          'picture': IMG_PATH.joinpath('PWM_FC.JPG')})
+                          'picture': IMG_PATH.joinpath('PWM_LC.JPG')},
+                  resources=(OPERATOR,), skip=crp_checkpointed)
+    step = case.add_step(display_img, name="Connect Power Meter FC line back to OPM",
+                         kwargs={"question": "Connect Power Meter FC line back to OPM",
+                                 'picture': IMG_PATH.joinpath('PWM_FC.JPG')},
+                         resources=(OPERATOR,), skip=crp_checkpointed)
     # sequence measure path loss
+    # the limit check of a bay runs while the operator moves the fiber to the next bay,
+    # the next bay prompts only start once the previous bay is measured
+    # bays already in the checkpoint of a resumed run are not measured again
+    prompt = step
+    measure = step
+    path_loss_steps = []
     for i in user_dict['Bay_Available']:
-        case.add_step(display_img, name="Bay {}: Clean and Inspect Source ".format(i),
-                      kwargs={"question": "Clean and Inspect Optic Cable {}".format(i),
-                              'picture': IMG_PATH.joinpath('CLEAN.JPG')})
-        case.add_step(display_img, name="Bay {}: Use LC Calibration fiber connect".format(i),
-                      kwargs={"question": f"Use LC Calibration fiber connect {i}",
-                              'picture': IMG_PATH.joinpath('LCF_toBay.JPG')})
-        case.add_step(osx_set_channel, name="Bay {}: Set OSW to TOSA Bay number".format(i), kwargs={"channel": i})
-        case.add_step(read_wlm_on_port, name="Bay {}: Set WLM measure on Port".format(i), kwargs={"bay": i})
-        case.add_step(read_opm_on_port, name="Bay {}: Set OPM measure on Port".format(i), kwargs={"bay": i})
-        case.add_step(tosa_path_los, name="Bay {}: Collect Data From Port".format(i), kwargs={"bay": i})
+        prompt = case.add_step(display_img, name="Bay {}: Clean and Inspect Source ".format(i),
+                               kwargs={"question": "Clean and Inspect Optic Cable {}".format(i),
+                                       'picture': IMG_PATH.joinpath('CLEAN.JPG')},
+                               depends=[prompt, measure], resources=(OPERATOR,), skip=partial(bay_checkpointed, i))
+        prompt = case.add_step(display_img, name="Bay {}: Use LC Calibration fiber connect".format(i),
+                               kwargs={"question": f"Use LC Calibration fiber connect {i}",
+                                       'picture': IMG_PATH.joinpath('LCF_toBay.JPG')},
+                               depends=[prompt], resources=(OPERATOR,), skip=partial(bay_checkpointed, i))
+        measure = case.add_step(read_bay_on_port, name="Bay {}: Set OSW and measure WLM/OPM on Port".format(i),
+                                kwargs={"bay": i}, resources=(OPM, WLM, OSW), skip=partial(bay_checkpointed, i))
+        path_loss_steps.append(case.add_step(tosa_path_los, name="Bay {}: Collect Data From Port".format(i),
+                                             kwargs={"bay": i}, depends=[measure, crp]))
     case.add_step(display_img, name="Confirm power End",
                   kwargs={"question": "Connect Power Meter With LC Confirm power End",
-                          'picture': IMG_PATH.joinpath('PWM_LC.JPG')})
-    case.add_step(power_laser_check, name="Verify Power End", kwargs={"tolerance": 1})  # tolerance 1 %
-    case.add_step(collect_data, name="Collect Data File Patch Loss", kwargs={"filename": Pl_FILE})
-    case.add_step(plot_by_data, name="Collect Data File Patch Loss", kwargs={"bay": user_dict['Bay_Available'],
-                                                                             "pl_file": Pl_FILE,
-                                                                             "pl_folder": Pl_FOLDER})
-    window = MainWindow()
+                          'picture': IMG_PATH.joinpath('PWM_LC.JPG')},
+                  depends=[prompt, measure], resources=(OPERATOR,))
+    power_end = case.add_step(power_laser_check, name="Verify Power End", kwargs={"tolerance": 1},  # tolerance 1 %
+                              resources=(OPM,))
+    case.add_step(log_settle_stats, name="Log Switch Settle Times", depends=[power_end], resources=(OSW,))
+    case.add_step(collect_data, name="Collect Data File Patch Loss", kwargs={"filename": Pl_FILE},
+                  depends=path_loss_steps + [power_end])
+    case.add_step(plot_by_data, name="Plot Control Chart Patch Loss", kwargs={"bay": user_dict['Bay_Available'],
+                                                                              "pl_file": Pl_FILE,
+                                                                              "pl_folder": Pl_FOLDER})
+    window = MainWindow(case=case)
     window.show()
     sys.exit(app.exec())
 
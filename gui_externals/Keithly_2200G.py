@@ -16,16 +16,22 @@ class Keithly_2200G(SCPI_Instrument):
         return f"Keithly_2230G:{self.address}"
 
     def initialization(self):
-        self.set_channel(1)
-        if self.get_current_limit() < 0.9:
-            self.set_current_limit(0.9)
-        if self.get_voltage_limit() < 3.5:
-            self.set_voltage_limit(3.5)
-        self.set_voltage(3.3)
+        # 2 round-trips: select the channel and read its limits, then write the settings
+        with self.batch() as batch:
+            batch.write(':INSTrument:NSELect 1')
+            current_limit = batch.query(':CURR?')
+            voltage_limit = batch.query(':VOLTage:LIMit?')
+        self._channel = 1
+        with self.batch() as batch:
+            if float(current_limit.result()) < 0.9:
+                batch.write(':CURRENT 0.9')
+            if float(voltage_limit.result()) < 3.5:
+                batch.write(':VOLTage:LIMit 3.5')
+            batch.write(':VOLTAGE 3.3')
 
     def set_channel(self, chan_num):
         if chan_num in [1, 2, 3]:
-            self.write(f"NSTrument:NSELect {self._channel}")
+            self.write(f"INSTrument:NSELect {chan_num}")
             self._channel = chan_num
         else:
             raise ValueError('Channel should be an integer from 1 through 3')
@@ -1,4 +1,5 @@
 from .VISA_Communicator import VISA_Communicator_Wrapper
+from .instruments_api.interfaces.scpi_batch import ScpiBatch, MAX_LINE_LEN
 
 
 class SCPI_Instrument:
@@ -23,6 +24,11 @@ class SCPI_Instrument:
     def __exit__(self, exc_type, exc_value, exc_tb):
         self.close()
 
+    def batch(self, max_len: int = MAX_LINE_LEN) -> ScpiBatch:
+        """ Batch of writes and queries sent as joined messages when its with block exits,
+        the queries return a concurrent.futures.Future resolved when the block exits """
+        return ScpiBatch(self, max_len)
+
     """Mandatory Commands Part:"""
 
     def CLS(self):
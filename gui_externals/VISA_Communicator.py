@@ -1,14 +1,14 @@
 import time
 
-import pyvisa as visa
+from .instruments_api.interfaces.visa_interface import get_resource_manager, open_shared_resource, \
+    release_shared_resource
 
-global rm
-rm = visa.ResourceManager()
+BACKEND = ''  # pyvisa default backend
 
 
 def sweep_resources(searchString: str = '?*'):
     print(f'Available resources based on the search string "{searchString}":')
-    devices = rm.list_resources(searchString)
+    devices = get_resource_manager(BACKEND).list_resources(searchString)
     if len(devices) > 0:
         for i, device in enumerate(devices):
             print(f'\t[{i}].{device}')
@@ -46,7 +46,7 @@ class VISA_Communicator_Wrapper:
     @address.setter
     def address(self, address):
         try:
-            self.communicator = rm.open_resource(f'{address}')
+            self.communicator = open_shared_resource(f'{address}', BACKEND)
             print(f'Successfully connected to: "{address}"')
             self._address = address
         except Exception as err:
@@ -68,7 +68,9 @@ class VISA_Communicator_Wrapper:
 
     def close(self):
         print(f'Connection to {self._address} is close')
-        self.communicator.close()
+        if self.communicator is not None:
+            self.communicator = None
+            release_shared_resource(self._address, BACKEND)
 
     def siesta(self, sec):
         time.sleep(sec)
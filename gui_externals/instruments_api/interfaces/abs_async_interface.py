@@ -0,0 +1,47 @@
+import abc
+import asyncio
+
+STREAM_LIMIT = 2 ** 24  # max reply size of the stream transports, the asyncio default of 64 KiB is below a trace dump
+
+
+class AsyncInterface(metaclass=abc.ABCMeta):
+    """ Common protocol of the asyncio transports
+
+    A reply is complete when its termination string is received, there is
+    no fixed delay between a write and the following read. Queries on the
+    same interface are serialized, queries on different interfaces can run
+    concurrently in one event loop (e.g. with asyncio.gather).
+    """
+
+    def __init__(self) -> None:
+        self._query_lock = None
+
+    @abc.abstractmethod
+    async def aconnect(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def aclose(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def awrite(self, cmd: str) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def aread(self) -> str:
+        pass
+
+    async def aquery(self, cmd: str) -> str:
+        if self._query_lock is None:
+            self._query_lock = asyncio.Lock()  # created in the running loop
+        async with self._query_lock:
+            await self.awrite(cmd)
+            return await self.aread()
+
+    async def __aenter__(self):
+        await self.aconnect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
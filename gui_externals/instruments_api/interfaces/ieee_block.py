@@ -0,0 +1,26 @@
+def recv_exact(recv_into, view: memoryview) -> None:
+    """ Fills the whole view using recv_into(view) -> number of bytes received """
+    pos = 0
+    while pos < len(view):
+        n = recv_into(view[pos:])
+        if n == 0:
+            raise EOFError(f'Connection closed after {pos} of {len(view)} bytes')
+        pos += n
+
+
+def read_definite_block(recv_into) -> bytearray:
+    """ Reads an IEEE-488.2 definite length block: #<n digits><length><data>
+
+    The data are received directly into one preallocated buffer.
+    :param recv_into: Callable(memoryview) -> number of bytes received, 0 if the connection is closed
+    :return: Data bytes of the block, without header
+    """
+    header = bytearray(2)
+    recv_exact(recv_into, memoryview(header))
+    if header[:1] != b'#' or not header[1:2].isdigit() or header[1:2] == b'0':
+        raise ValueError(f'Not an IEEE-488.2 definite length block header: {bytes(header)}')
+    length_field = bytearray(int(header[1:2]))
+    recv_exact(recv_into, memoryview(length_field))
+    data = bytearray(int(length_field))
+    recv_exact(recv_into, memoryview(data))
+    return data
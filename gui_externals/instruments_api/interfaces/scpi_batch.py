@@ -0,0 +1,126 @@
+import threading
+import weakref
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+MAX_LINE_LEN = 200  # default max length of a joined message
+
+_locks = weakref.WeakKeyDictionary()  # interface -> lock held while a batch is sent
+_locks_guard = threading.Lock()
+
+
+def interface_lock(interface) -> threading.RLock:
+    """ Lock serializing the batches sent through one interface """
+    with _locks_guard:
+        lock = _locks.get(interface)
+        if lock is None:
+            lock = _locks[interface] = threading.RLock()
+        return lock
+
+
+class ScpiBatch:
+    """ Queue of SCPI writes and queries sent to an interface or instrument as joined messages
+
+    write() queues a command and query() returns a concurrent.futures.Future.
+    On exit of the with block (or flush()) the commands are joined with ';'
+    into messages of at most max_len characters, and the replies of every
+    message are split back on ';' into the futures of its queries.
+    The commands are sent unchanged: a command following another one in a
+    message is relative to its path, so it starts with ':' (or '*'):
+
+        with interface.batch() as batch:
+            batch.write(':SENS1:POW:WAV 1550NM')
+            unit = batch.query(':SENS1:POW:UNIT?')
+        unit.result()
+
+    The interface itself is not modified, the messages are sent with its
+    write() and query() while holding interface_lock(interface).
+    """
+
+    def __init__(self, interface, max_len: int = MAX_LINE_LEN, separator: str = ';'):
+        self._interface = interface
+        self.max_len = max_len
+        self.separator = separator
+        self._queue = []  # (command, future or None for a write)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.flush()
+        else:
+            self.cancel()
+
+    def write(self, cmd: str) -> None:
+        self._queue.append((cmd.strip(), None))
+
+    def query(self, cmd: str) -> Future:
+        future = Future()
+        self._queue.append((cmd.strip(), future))
+        return future
+
+    def cancel(self) -> None:
+        """ Drops the queued commands, their futures are cancelled """
+        for _, future in self._queue:
+            if future is not None:
+                future.cancel()
+        self._queue = []
+
+    def _messages(self, queue: list) -> list:
+        """ Splits the queued commands into messages of at most max_len characters """
+        messages = [[]]
+        length = 0
+        for cmd, future in queue:
+            if messages[-1] and length + len(self.separator) + len(cmd) > self.max_len:
+                messages.append([])
+                length = 0
+            length += len(cmd) + (len(self.separator) if messages[-1] else 0)
+            messages[-1].append((cmd, future))
+        return [message for message in messages if message]
+
+    def flush(self) -> None:
+        """ Sends the queued commands, one round-trip per message containing queries """
+        queue, self._queue = self._queue, []
+        with interface_lock(self._interface):
+            for message in self._messages(queue):
+                text = self.separator.join(cmd for cmd, _ in message)
+                futures = [future for _, future in message if future is not None]
+                if not futures:
+                    self._interface.write(text)
+                    continue
+                try:
+                    replies = self._interface.query(text).split(self.separator)
+                    if len(replies) != len(futures):
+                        raise ValueError(f'{len(futures)} replies expected to "{text}", got: {replies}')
+                except Exception as e:
+                    for future in futures:
+                        future.set_exception(e)
+                    raise
+                for future, reply in zip(futures, replies):
+                    future.set_result(reply.strip())
+
+
+def batch_of(interface, **kwargs) -> ScpiBatch:
+    """ batch() of the interface, or a batch sending every command alone if the interface cannot join them """
+    if hasattr(interface, 'batch'):
+        return interface.batch(**kwargs)
+    return ScpiBatch(interface, max_len=0)
+
+
+@contextmanager
+def batched(driver, **kwargs):
+    """ Queues the writes of the driver methods called in the with block, e.g. its setters
+
+    driver._interface refers to the batch for the duration of the block: the
+    driver methods write to the batch, the interface shared with other
+    drivers is not modified. The driver must not be used from another thread
+    meanwhile, and its methods called in the block must only write.
+    """
+    interface = driver._interface
+    with batch_of(interface, **kwargs) as batch:
+        driver._interface = batch
+        try:
+            yield batch
+        finally:
+            driver._interface = interface
@@ -1,20 +1,28 @@
+import asyncio
 import serial
 import logging
 import time
+from collections import deque
+
+from .abs_async_interface import AsyncInterface
+from .scpi_batch import ScpiBatch, MAX_LINE_LEN
 
 
 class SerialInterface:
     def __init__(self, address, baudrate,
                  bytesize=serial.EIGHTBITS, parity=serial.PARITY_NONE, stopbits=serial.STOPBITS_ONE,
                  prompt: str = "\r", eol: str = "\r", encoding="utf-8",
-                 timeout: float = 0.1, logger_name: str = __name__):
+                 timeout: float = 0.1, reply_timeout: float = 1.0, logger_name: str = __name__):
         self.logger = logging.getLogger(logger_name)
         self.address = address
         self.baudrate = baudrate
         self.prompt = prompt
         self.eol = eol
         self.encoding = encoding
-        self.timeout = timeout
+        self.timeout = timeout  # inter-byte timeout, a pause this long ends an unterminated reply
+        self.reply_timeout = reply_timeout  # max wait for the first byte of a reply
+        self._rx = bytearray()  # received bytes not consumed yet
+        self._latency = {}  # command -> last query latencies (s)
         self.ser = serial.Serial(port=None,
                                  baudrate=self.baudrate,
                                  bytesize=bytesize,
@@ -34,6 +42,7 @@ class SerialInterface:
         self.ser.close()
         self.ser.setPort(com)
         self.ser.open()
+        self._rx.clear()
         self.logger.debug(f"Serial session to host: {self.address} connected")
 
     def disconnect(self) -> None:
@@ -49,18 +58,51 @@ class SerialInterface:
         self.ser.write(cmd)
         self.logger.debug(cmd)
 
+    def _read_frame(self) -> bytes:
+        """ Reads up to the prompt, draining whatever is waiting in the driver buffer at once """
+        prompt = self.prompt.encode(self.encoding)
+        deadline = time.monotonic() + self.reply_timeout
+        searched = 0
+        while True:
+            idx = self._rx.find(prompt, searched)
+            if idx >= 0:
+                frame = bytes(self._rx[:idx])
+                del self._rx[:idx + len(prompt)]
+                return frame
+            searched = max(0, len(self._rx) - len(prompt) + 1)
+            chunk = self.ser.read(max(self.ser.in_waiting, 1))  # blocks up to self.timeout
+            if chunk:
+                self._rx += chunk
+            elif self._rx or time.monotonic() > deadline:
+                # pause after a partial reply, or no reply at all
+                frame = bytes(self._rx)
+                self._rx.clear()
+                return frame
+
     def read(self):
-        reply = self.ser.read_until(expected=self.prompt)
+        reply = self._read_frame()
         self.logger.debug(reply)
-        reply = reply.decode(self.encoding).rstrip(self.prompt)
+        reply = reply.decode(self.encoding)
         if not reply:
             raise ConnectionError("Data read error: no data")
         return reply
 
     def query(self, cmd):
+        start = time.perf_counter()
         self.write(cmd)
-        time.sleep(0.1)
-        return self.read()
+        reply = self.read()
+        key = cmd.strip().split(' ')[0]
+        self._latency.setdefault(key, deque(maxlen=100)).append(time.perf_counter() - start)
+        return reply
+
+    def batch(self, max_len: int = MAX_LINE_LEN) -> ScpiBatch:
+        """ Batch of writes and queries sent as joined messages when its with block exits """
+        return ScpiBatch(self, max_len)
+
+    def get_latency_stats(self) -> dict:
+        """ Query latency per command (s): count, mean and max of the last 100 queries """
+        return {cmd: {'count': len(values), 'mean': sum(values) / len(values), 'max': max(values)}
+                for cmd, values in self._latency.items()}
 
     def close(self) -> None:
         if self.ser:
@@ -68,3 +110,31 @@ class SerialInterface:
 
     def __del__(self) -> None:
         self.disconnect()
+
+
+class AsyncSerialInterface(AsyncInterface):
+    """ asyncio counterpart of SerialInterface
+
+    pyserial is blocking, the reads and writes run in a worker thread and
+    complete on the prompt string, without the fixed delay of query()
+    """
+
+    def __init__(self, address, baudrate, **kwargs):
+        super().__init__()
+        self._interface = SerialInterface(address, baudrate, **kwargs)
+
+    def __repr__(self) -> str:
+        return f"Async Serial Interface {self._interface.address}"
+
+    async def aconnect(self) -> None:
+        if self._interface.ser is None or not self._interface.ser.is_open:
+            await asyncio.to_thread(self._interface.connect, self._interface.address)
+
+    async def aclose(self) -> None:
+        await asyncio.to_thread(self._interface.close)
+
+    async def awrite(self, cmd):
+        await asyncio.to_thread(self._interface.write, cmd)
+
+    async def aread(self):
+        return await asyncio.to_thread(self._interface.read)
@@ -1,34 +1,44 @@
+import asyncio
 import socket
 import logging
+import select
 import time
 
+from .abs_async_interface import AsyncInterface, STREAM_LIMIT
+from .ieee_block import read_definite_block
+from .scpi_batch import ScpiBatch, MAX_LINE_LEN
+
 
 BUFFER_SIZE = 4096
 TIMEOUT_IN_SECONDS = 5
-MAX_RETRIES = 1000
 
 
 class SocketInterface:
     def __init__(self, ip, port, logger_name=__name__,
                  prompt: str = '\r\n', eol: str = '\r\n',
-                 cls_before_cmd=False, fragments_enabled=False, encoding="utf-8"):
+                 cls_before_cmd=False, fragments_enabled=False, encoding="utf-8",
+                 timeout: float = TIMEOUT_IN_SECONDS):
         self._ip = ip
         self._port = port
-        self.prompt = prompt  # prompt string used by .read()
+        self.prompt = prompt  # prompt string used by .read(), empty to return a single recv()
         self.eol = eol  # End of Line string used by .write()
         self.s = None
         self.cls_before_cmd = cls_before_cmd
-        self.fragments_enabled = fragments_enabled
+        self.fragments_enabled = fragments_enabled  # kept for compatibility, every read waits for the prompt
         self.encoding = encoding
+        self.timeout = timeout  # max time to receive a whole reply
         self.logger = logging.getLogger(logger_name)
+        self._rx = bytearray()  # received bytes not consumed yet
+        self._chunk = bytearray(BUFFER_SIZE)  # reusable recv_into() buffer
 
     def __repr__(self):
         return f"SocketInterface {self._ip}:{self._port}"
 
     def connect(self):
         self.s = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
-        self.s.settimeout(TIMEOUT_IN_SECONDS)
+        self.s.settimeout(self.timeout)
         self.s.connect((self._ip, self._port))
+        self._rx.clear()
         self.logger.debug("Connected")
 
     def disconnect(self):
@@ -53,38 +63,127 @@ class SocketInterface:
         self.s.sendall(cmd.encode(self.encoding))
         self.logger.debug(cmd)
 
+    def _fill(self, deadline: float) -> None:
+        """ Appends the next received bytes to the buffer """
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise socket.timeout(f"No complete reply within {self.timeout}s: {bytes(self._rx[:80])}")
+        self.s.settimeout(remaining)
+        n = self.s.recv_into(self._chunk)
+        if n == 0:
+            raise ConnectionError("Connection closed by the instrument")
+        self._rx += memoryview(self._chunk)[:n]
+
+    def _block_length(self):
+        """ Total length of a definite binary block at the start of the buffer
+
+        :return: None if the header is incomplete, 0 if the reply is not a definite block
+            (no digit after '#', or an indefinite '#0' block ending with the prompt)
+        """
+        if len(self._rx) < 2:
+            return None
+        if not self._rx[1:2].isdigit() or self._rx[1:2] == b'0':
+            return 0
+        n_digits = int(self._rx[1:2])
+        if len(self._rx) < 2 + n_digits:
+            return None
+        length_field = bytes(self._rx[2:2 + n_digits])
+        if not length_field.isdigit():
+            return 0
+        return 2 + n_digits + int(length_field)
+
+    def _read_reply(self) -> bytes:
+        """ Receives until the prompt, or until the end of a definite binary block (#<n><length><data>) """
+        prompt = self.prompt.encode(self.encoding)
+        deadline = time.monotonic() + self.timeout
+        if not prompt:
+            if not self._rx:
+                self._fill(deadline)
+            data = bytes(self._rx)
+            self._rx.clear()
+            return data
+
+        searched = 0
+        while True:
+            length = self._block_length() if self._rx[:1] == b'#' else 0
+            if length:
+                if len(self._rx) >= length:
+                    data = bytes(self._rx[:length])
+                    del self._rx[:length]
+                    if self._rx[:len(prompt)] == prompt:
+                        del self._rx[:len(prompt)]
+                    return data
+            elif length == 0:
+                idx = self._rx.find(prompt, searched)
+                if idx >= 0:
+                    data = bytes(self._rx[:idx])
+                    del self._rx[:idx + len(prompt)]
+                    return data
+                searched = max(0, len(self._rx) - len(prompt) + 1)
+            self._fill(deadline)
+
     def read(self):
         if self.s is None:
             self.connect()
 
-        # the reply can be fragmented
-        if self.fragments_enabled:
-            fragments = []
-            for _ in range(MAX_RETRIES):
-                chunk = self.s.recv(BUFFER_SIZE)
-                # print(chunk)
-                fragments.append(chunk)
-                if chunk.endswith(self.prompt.encode(self.encoding)):
-                    break
-            data = b''.join(fragments)
-        else:
-            # TODO: improve robustness including a verification for termination string
-            data = self.s.recv(BUFFER_SIZE)
+        data = self._read_reply()
 
         # the reply can be in hex
         self.logger.debug(data)
         try:
-            reply = data.decode(self.encoding).rstrip(self.prompt)
+            reply = data.decode(self.encoding)
         except UnicodeDecodeError:
-            reply = data.rstrip(self.prompt.encode("utf-8")).hex()
+            reply = data.hex()
         return reply
 
+    def read_banner(self, wait_sec: float = 0.5) -> str:
+        """ Reads the opening message and discards the rest of the input pending after it
+
+        :param wait_sec: Time without any received byte ending the opening message
+        :return: First line of the opening message
+        """
+        banner = self.read()
+        while select.select([self.s], [], [], wait_sec)[0]:
+            if self.s.recv_into(self._chunk) == 0:
+                break
+        self._rx.clear()
+        return banner
+
+    def _recv_into(self, view: memoryview) -> int:
+        """ recv_into() serving the buffered bytes first """
+        if self._rx:
+            n = min(len(self._rx), len(view))
+            view[:n] = self._rx[:n]
+            del self._rx[:n]
+            return n
+        return self.s.recv_into(view)
+
+    def read_binary_block(self):
+        """ Reads an IEEE-488.2 definite length block reply into a preallocated buffer """
+        if self.s is None:
+            self.connect()
+
+        self.s.settimeout(self.timeout)
+        data = read_definite_block(self._recv_into)
+        self.logger.debug(f'Binary block of {len(data)} bytes')
+        # discard the terminator following the block, if any
+        prompt = self.prompt.encode(self.encoding)
+        if len(self._rx) < len(prompt):
+            ready, _, _ = select.select([self.s], [], [], 0.05)
+            if ready:
+                self._fill(time.monotonic() + self.timeout)
+        if prompt and self._rx[:len(prompt)] == prompt:
+            del self._rx[:len(prompt)]
+        return data
+
     def query(self, cmd):
         self.write(cmd)
-        # TODO: improve delay between write and read commands to a more general implementation
-        time.sleep(0.1)
         return self.read()
 
+    def batch(self, max_len: int = MAX_LINE_LEN) -> ScpiBatch:
+        """ Batch of writes and queries sent as joined messages when its with block exits """
+        return ScpiBatch(self, max_len)
+
     def close(self):
         self.__del__()
 
@@ -92,3 +191,64 @@ class SocketInterface:
         if self.s:
             self.s.close()
         self.logger.debug(f"Socket interface {self._ip} disconnected.")
+
+
+class AsyncSocketInterface(AsyncInterface):
+    """ asyncio counterpart of SocketInterface, a reply ends with the prompt string """
+
+    def __init__(self, ip, port, logger_name=__name__,
+                 prompt: str = '\r\n', eol: str = '\r\n',
+                 cls_before_cmd=False, encoding="utf-8", timeout: float = TIMEOUT_IN_SECONDS,
+                 limit: int = STREAM_LIMIT):
+        super().__init__()
+        self._ip = ip
+        self._port = port
+        self.prompt = prompt
+        self.eol = eol
+        self.cls_before_cmd = cls_before_cmd
+        self.encoding = encoding
+        self.timeout = timeout
+        self.limit = limit  # max reply size (bytes)
+        self.logger = logging.getLogger(logger_name)
+        self._reader = None
+        self._writer = None
+
+    def __repr__(self):
+        return f"AsyncSocketInterface {self._ip}:{self._port}"
+
+    async def aconnect(self):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self._ip, self._port, limit=self.limit), self.timeout)
+        self.logger.debug("Connected")
+
+    async def aclose(self):
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+            self._reader = self._writer = None
+            self.logger.debug("Disconnected")
+
+    async def awrite(self, cmd):
+        if self._writer is None:
+            await self.aconnect()
+
+        if self.cls_before_cmd:
+            self._writer.write(f"*CLS{self.eol}".encode(self.encoding))
+        if not cmd.endswith(self.eol):
+            cmd += self.eol
+        self._writer.write(cmd.encode(self.encoding))
+        await self._writer.drain()
+        self.logger.debug(cmd)
+
+    async def aread(self):
+        if self._reader is None:
+            await self.aconnect()
+
+        data = await asyncio.wait_for(self._reader.readuntil(self.prompt.encode(self.encoding)), self.timeout)
+        self.logger.debug(data)
+        data = data[:-len(self.prompt)]
+        try:
+            reply = data.decode(self.encoding)
+        except UnicodeDecodeError:
+            reply = data.hex()
+        return reply
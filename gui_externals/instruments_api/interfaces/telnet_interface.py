@@ -1,5 +1,11 @@
+import asyncio
 import telnetlib
 import logging
+import select
+
+from .abs_async_interface import AsyncInterface, STREAM_LIMIT
+from .ieee_block import read_definite_block
+from .scpi_batch import ScpiBatch, MAX_LINE_LEN
 
 
 class TelnetInterface:
@@ -58,9 +64,144 @@ class TelnetInterface:
 
         return self.read()
 
+    def batch(self, max_len: int = MAX_LINE_LEN) -> ScpiBatch:
+        """ Batch of writes and queries sent as joined messages when its with block exits """
+        return ScpiBatch(self, max_len)
+
+    def _recv_raw_into(self, view: memoryview) -> int:
+        """ Receives raw bytes, bypassing the telnet option processing
+
+        Bytes already buffered by telnetlib (rawq) are consumed first
+        """
+        pending = len(self.tn.rawq) - self.tn.irawq
+        if pending > 0:
+            n = min(pending, len(view))
+            view[:n] = self.tn.rawq[self.tn.irawq:self.tn.irawq + n]
+            self.tn.irawq += n
+            if self.tn.irawq >= len(self.tn.rawq):
+                self.tn.rawq = b''
+                self.tn.irawq = 0
+            return n
+        return self.tn.sock.recv_into(view)
+
+    def read_binary_block(self) -> bytearray:
+        """ Reads an IEEE-488.2 definite length block reply, e.g. a spectrum
+
+        The data are received into a preallocated buffer, then the
+        terminator following the block is discarded if already received
+        """
+        data = read_definite_block(self._recv_raw_into)
+        self._discard_prompt()
+        return data
+
+    def _discard_prompt(self, wait_sec: float = 0.05) -> None:
+        prompt = self.prompt.encode()
+        if len(self.tn.rawq) - self.tn.irawq < len(prompt):
+            ready, _, _ = select.select([self.tn.sock], [], [], wait_sec)
+            if not ready:
+                return
+            self.tn.rawq = self.tn.rawq[self.tn.irawq:] + self.tn.sock.recv(len(prompt))
+            self.tn.irawq = 0
+        if self.tn.rawq[self.tn.irawq:self.tn.irawq + len(prompt)] == prompt:
+            self.tn.irawq += len(prompt)
+
     def close(self) -> None:
         if self.tn:
             self.disconnect()
 
     def __del__(self) -> None:
         self.disconnect()
+
+
+class AsyncTelnetInterface(AsyncInterface):
+    """ asyncio counterpart of TelnetInterface
+
+    Telnet option negotiations (IAC sequences) are stripped from the
+    replies and refused, the same as telnetlib does without a callback
+    """
+
+    def __init__(self, ip: str, port: int = 23,
+                 prompt: str = '\r\n', eol: str = '\r\n',
+                 timeout: float = 5.0,
+                 logger_name: str = __name__,
+                 limit: int = STREAM_LIMIT) -> None:
+        super().__init__()
+        self.ip = ip
+        self.port = port
+        self.prompt = prompt
+        self.eol = eol
+        self.timeout = timeout
+        self.limit = limit  # max reply size (bytes)
+        self.logger = logging.getLogger(logger_name)
+        self._reader = None
+        self._writer = None
+
+    def __repr__(self) -> str:
+        return f"Async Telnet Interface host {self.ip} port {self.port}"
+
+    async def aconnect(self) -> None:
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.ip, self.port, limit=self.limit), self.timeout)
+        self.logger.debug(
+            f"Telnet session to host: {self.ip} at port: {self.port} "
+            f"connected")
+
+    async def aclose(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+            self._reader = self._writer = None
+        self.logger.debug(
+            f"Telnet session to host: {self.ip} at port: {self.port} closed")
+
+    async def awrite(self, msg: str) -> None:
+        if not msg.endswith(self.eol):
+            msg += self.eol
+
+        self._writer.write(msg.encode().replace(telnetlib.IAC, telnetlib.IAC + telnetlib.IAC))
+        await self._writer.drain()
+
+    async def aread(self) -> str:
+        prompt = self.prompt.encode()
+        buff = b''
+        while not buff.endswith(prompt):
+            chunk = await asyncio.wait_for(self._reader.readuntil(prompt), self.timeout)
+            buff += self._strip_iac(chunk)
+        return buff[:-len(prompt)].decode()
+
+    async def adrain(self, wait_sec: float = 0.5) -> bytes:
+        """ Discards the pending input, e.g. the opening message """
+        buff = b''
+        while True:
+            try:
+                buff += await asyncio.wait_for(self._reader.read(4096), wait_sec)
+            except asyncio.TimeoutError:
+                return self._strip_iac(buff)
+
+    def _strip_iac(self, data: bytes) -> bytes:
+        """ Removes the telnet commands from data, refusing any option negotiation """
+        if telnetlib.IAC not in data:
+            return data
+        out = bytearray()
+        i = 0
+        while i < len(data):
+            byte = data[i:i + 1]
+            if byte != telnetlib.IAC:
+                out += byte
+                i += 1
+                continue
+            cmd = data[i + 1:i + 2]
+            if cmd == telnetlib.IAC:
+                out += telnetlib.IAC
+                i += 2
+            elif cmd in (telnetlib.DO, telnetlib.DONT, telnetlib.WILL, telnetlib.WONT):
+                opt = data[i + 2:i + 3]
+                reply = telnetlib.WONT if cmd in (telnetlib.DO, telnetlib.DONT) else telnetlib.DONT
+                self._writer.write(telnetlib.IAC + reply + opt)
+                i += 3
+            elif cmd == telnetlib.SB:
+                end = data.find(telnetlib.IAC + telnetlib.SE, i + 2)
+                i = len(data) if end < 0 else end + 2
+            else:
+                i += 2
+        return bytes(out)
@@ -1,5 +1,7 @@
 import logging
 
+from .scpi_batch import ScpiBatch, MAX_LINE_LEN
+
 
 class VirtualInterface:
     def __init__(self, logger_name):
@@ -15,10 +17,14 @@ class VirtualInterface:
         return echo
 
     def query(self, cmd):
-        echo = "1234567890"
+        echo = ';'.join(["1234567890"] * max(1, cmd.count('?')))  # one reply per query of a joined message
         self.logger.debug(echo)
         return echo
 
+    def batch(self, max_len: int = MAX_LINE_LEN) -> ScpiBatch:
+        """ Batch of writes and queries sent as joined messages when its with block exits """
+        return ScpiBatch(self, max_len)
+
     def close(self):
         self.logger.info("Virtual interface closed")
 
@@ -1,17 +1,60 @@
+import threading
+
 import pyvisa
 import logging
 
+from .scpi_batch import ScpiBatch, MAX_LINE_LEN
+
 
 TIMEOUT_IN_SECONDS = 5
 
+# Process-wide VISA state: one ResourceManager per backend and one open session per address,
+# shared by all the drivers and closed when the last user releases it
+_resource_managers = {}
+_resources = {}  # (backend, address) -> [resource, reference count]
+_registry_lock = threading.RLock()
+
+
+def get_resource_manager(backend='@ivi'):
+    """ Shared ResourceManager of the backend, created on first use """
+    with _registry_lock:
+        if backend not in _resource_managers:
+            _resource_managers[backend] = pyvisa.ResourceManager(backend)
+        return _resource_managers[backend]
+
+
+def open_shared_resource(address, backend='@ivi'):
+    """ Opens the resource, or returns the session already opened for this address """
+    key = (backend, address)
+    with _registry_lock:
+        if key in _resources:
+            _resources[key][1] += 1
+        else:
+            _resources[key] = [get_resource_manager(backend).open_resource(address), 1]
+        return _resources[key][0]
+
+
+def release_shared_resource(address, backend='@ivi'):
+    """ Releases one reference to the resource, the session is closed with the last one """
+    key = (backend, address)
+    with _registry_lock:
+        entry = _resources.get(key)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del _resources[key]
+            entry[0].close()
+
 
 class VISAInterface:
     def __init__(self, address, logger_name=__name__, backend='@ivi'):
         visa_logger = logging.getLogger('pyvisa')
         visa_logger.setLevel(logging.INFO)  # pyvisa generates too many debug messages
-        self.rm = pyvisa.ResourceManager(backend)
+        self.rm = get_resource_manager(backend)
+        self.backend = backend
         self.address = address
-        self.inst = self.rm.open_resource(address)
+        self.inst = open_shared_resource(address, backend)
         self.inst.timeout = TIMEOUT_IN_SECONDS * 1000
         self.logger = logging.getLogger(logger_name)
 
@@ -29,16 +72,30 @@ class VISAInterface:
         self.logger.debug(reply)
         return reply
 
+    def read_binary_block(self) -> bytearray:
+        """ Reads an IEEE-488.2 definite length block reply, e.g. a trace
+
+        The termination following the block is consumed
+        """
+        data = self.inst.read_binary_values(datatype='s', container=bytearray)
+        self.logger.debug(f"Binary block of {len(data)} bytes")
+        return data
+
     def query(self, cmd):
         self.logger.debug(cmd)
         reply = self.inst.query(cmd)
         self.logger.debug(reply.strip())
         return reply.strip()
 
+    def batch(self, max_len: int = MAX_LINE_LEN) -> ScpiBatch:
+        """ Batch of writes and queries sent as joined messages when its with block exits """
+        return ScpiBatch(self, max_len)
+
     def close(self):
         self.__del__()
 
     def __del__(self):
-        if self.inst:
-            self.inst.close()
-        self.logger.debug(f"VISA interface {self.address} disconnected.")
+        if getattr(self, 'inst', None) is not None:
+            self.inst = None
+            release_shared_resource(self.address, self.backend)
+            self.logger.debug(f"VISA interface {self.address} disconnected.")
@@ -1,19 +1,54 @@
+import asyncio
 import requests
 import logging
+import time
+from collections import deque
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+from .abs_async_interface import AsyncInterface
+
+
+TIMEOUT_IN_SECONDS = 5
 
 
 class WebInterface:
-    def __init__(self, ip, port, logger_name):
+    """ HTTP client of the REST instruments
+
+    Requests go through one requests.Session, so the TCP connections are
+    kept alive and reused (at most pool_size per host). Failed connections
+    are retried with a short backoff, and GETs also on 502/503/504 replies;
+    POSTs are not resent once the request was sent.
+    """
+
+    def __init__(self, ip, port, logger_name, pool_size: int = 4, retries: int = 2,
+                 timeout: float = TIMEOUT_IN_SECONDS):
         self._ip = ip
         if port is not None:
             self._port = f":{port}"
         else:
             self._port = ""
         self.logger = logging.getLogger(logger_name)
+        self.timeout = timeout
+        self._latency = {}  # endpoint -> last request latencies (s)
+        self.pool_size = pool_size
+        self.retries = retries
+        self.session = None
+        self.connect()
 
     def __repr__(self):
         return f"WebInterface {self._ip}:{self._port}"
 
+    def connect(self):
+        """ Opens the keep-alive session if it is closed """
+        if self.session is not None:
+            return
+        retry = Retry(total=self.retries, backoff_factor=0.05, status_forcelist=(502, 503, 504),
+                      allowed_methods=frozenset({'GET'}), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+
     def write(self, cmd):
         # parse cmd
         func = cmd.split(" ")[0]
@@ -36,7 +71,7 @@ class WebInterface:
         cmd = f"http://{self._ip}{self._port}{func}"
         self.logger.debug(cmd)
         self.logger.debug(data)
-        requests.post(cmd, json=data, timeout=5).content.decode()
+        return self._request('POST', func, json=data).content.decode()
 
     def read(self):
         pass
@@ -44,15 +79,33 @@ class WebInterface:
     def query(self, cmd, params=None, bin_data=False, json_data=False):
         if params is None:
             params = {}
-        cmd = f"http://{self._ip}{self._port}{cmd}"
-        self.logger.debug(cmd)
+        self.logger.debug(f"http://{self._ip}{self._port}{cmd}")
         if bin_data:
-            reply = requests.get(cmd, params=params, timeout=5).content
+            reply = self._request('GET', cmd, params=params).content
         else:
-            reply = requests.get(cmd, params=params, timeout=5).content.decode()
+            reply = self._request('GET', cmd, params=params).content.decode()
         self.logger.debug(reply)
         return reply
 
+    def _request(self, method, endpoint, **kwargs) -> requests.Response:
+        if self.session is None:
+            self.connect()
+        start = time.perf_counter()
+        response = self.session.request(method, f"http://{self._ip}{self._port}{endpoint}",
+                                        timeout=self.timeout, **kwargs)
+        self._latency.setdefault(endpoint, deque(maxlen=100)).append(time.perf_counter() - start)
+        return response
+
+    def get_latency_stats(self) -> dict:
+        """ Request latency per endpoint (s): count, mean and max of the last 100 requests """
+        return {endpoint: {'count': len(values), 'mean': sum(values) / len(values), 'max': max(values)}
+                for endpoint, values in self._latency.items()}
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
     def __isfloat(self, x):
         try:
             float(x)
@@ -69,3 +122,34 @@ class WebInterface:
             return False
         else:
             return a == b
+
+
+class AsyncWebInterface(AsyncInterface):
+    """ asyncio counterpart of WebInterface, the HTTP requests run in a worker thread
+
+    HTTP has no reply without a request: aread() returns the reply of the last awrite().
+    """
+
+    def __init__(self, ip, port, logger_name, **kwargs):
+        super().__init__()
+        self._interface = WebInterface(ip, port, logger_name, **kwargs)
+        self._reply = None  # reply of the last awrite() not read yet
+
+    def __repr__(self):
+        return f"AsyncWebInterface {self._interface._ip}:{self._interface._port}"
+
+    async def aconnect(self):
+        self._interface.connect()
+
+    async def aclose(self):
+        self._interface.close()
+
+    async def awrite(self, cmd):
+        self._reply = await asyncio.to_thread(self._interface.write, cmd)
+
+    async def aread(self):
+        reply, self._reply = self._reply, None
+        return reply
+
+    async def aquery(self, cmd, params=None, bin_data=False, json_data=False):
+        return await asyncio.to_thread(self._interface.query, cmd, params, bin_data, json_data)
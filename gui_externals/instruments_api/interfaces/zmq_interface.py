@@ -13,9 +13,14 @@ The server abstracts interfaces, so it doesn't know anything about device states
 """
 
 
+import asyncio
 import zmq
+import zmq.asyncio
 import logging
 
+from .abs_async_interface import AsyncInterface
+from .scpi_batch import ScpiBatch, MAX_LINE_LEN
+
 
 TIMEOUT_IN_SECONDS = 10
 SERVER_IP = "10.1.99.24"
@@ -52,6 +57,10 @@ class ZMQInterface:
     def query(self, cmd: str) -> str:
         return self._zmq_com("query", cmd)
 
+    def batch(self, max_len: int = MAX_LINE_LEN) -> ScpiBatch:
+        """ Batch of writes and queries sent as joined messages when its with block exits """
+        return ScpiBatch(self, max_len)
+
     def read(self, cmd: str) -> str:
         return self._zmq_com("read", cmd)
 
@@ -64,6 +73,62 @@ class ZMQInterface:
         self.close()
 
 
+class AsyncZMQInterface(AsyncInterface):
+    """ asyncio counterpart of ZMQInterface based on zmq.asyncio """
+
+    def __init__(self, interface_id):
+        super().__init__()
+        self.interface_id = interface_id
+        self.context = zmq.asyncio.Context.instance()
+        self.socket = None
+        self.logger = logging.getLogger(interface_id)
+
+    async def aconnect(self):
+        self.socket = self.context.socket(zmq.DEALER)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.connect(f"tcp://{SERVER_IP}:{SERVER_PORT}")
+        self.logger.debug(f"Connection to {SERVER_IP}:{SERVER_PORT} opened")
+
+    async def aclose(self):
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+            self.logger.debug(f"Connection to {SERVER_IP}:{SERVER_PORT} closed")
+
+    async def _azmq_com(self, func, arg):
+        if self.socket is None:
+            await self.aconnect()
+        if self._query_lock is None:
+            self._query_lock = asyncio.Lock()
+        # one request in flight, so every reply matches its request
+        async with self._query_lock:
+            self.logger.debug(f"Sending: {self.interface_id} - {func} - {arg}")
+            await self.socket.send_multipart([self.interface_id.encode(), func.encode(), arg.encode()])
+            try:
+                reply = (await asyncio.wait_for(self.socket.recv(), TIMEOUT_IN_SECONDS)).decode()
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                # a late reply would be received by the next request: drop the socket, a new one
+                # gets a new identity and the server discards the replies to the old one
+                await self.aclose()
+                raise
+        if reply:
+            if reply.startswith('Error'):
+                self.logger.error(f"Received {reply}")
+                raise RuntimeError(f"The command {func} - {arg} failed: {reply}")
+        self.logger.debug(f"Received: {reply}")
+        return reply
+
+    async def awrite(self, cmd: str) -> str:
+        return await self._azmq_com("write", cmd)
+
+    async def aread(self, cmd: str = "") -> str:
+        return await self._azmq_com("read", cmd)
+
+    async def aquery(self, cmd: str) -> str:
+        # the server does the write/read of a query, one request and one reply
+        return await self._azmq_com("query", cmd)
+
+
 if __name__ == "__main__":
     logging.basicConfig(format='%(asctime)s - %(name)6s - %(levelname)5s - %(message)s', level=logging.DEBUG)
     interfaces = []
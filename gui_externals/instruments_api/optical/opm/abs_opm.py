@@ -1,5 +1,8 @@
 import abc
 import logging
+
+from ...interfaces.scpi_batch import batched
+
 logger = logging.getLogger(__name__)
 
 
@@ -100,20 +103,21 @@ class AbsPWM(metaclass=abc.ABCMeta):
                 cfg:(dict) Power meter configuration
         """
         supported_cfg_keywords = ["wl", "freq", "pwr_unit", "avg_time", "pwr_range", "pwr_range_auto", "offset"]
-        for k, v in cfg.items():
-            if k not in supported_cfg_keywords:
-                logging.warning(f"{k} is not a supported cfg keyword. Ignore. Supported: {supported_cfg_keywords}")
-            elif k == 'wl' and cfg["wl"] is not None:
-                self.set_wl_nm(cfg["wl"])
-            elif k == 'freq' and cfg["freq"] is not None:
-                self.set_freq_THz(cfg["freq"])
-            elif k == 'pwr_unit' and cfg["pwr_unit"] is not None:
-                self.pwr_unit = cfg["pwr_unit"]
-            elif k == 'avg_time' and cfg["avg_time"] is not None:
-                self.set_avg_time_s(cfg["avg_time"])
-            elif k == 'pwr_range' and cfg["pwr_range"] is not None:
-                self.set_pwr_range_dBm(cfg["pwr_range"])
-            elif k == 'pwr_range_auto' and cfg["pwr_range_auto"] is not None:
-                self.set_pwr_range_auto(cfg["pwr_range_auto"])
-            elif k == 'offset' and cfg["offset"] is not None:
-                self.set_offset(cfg["offset"])
+        with batched(self):  # the setters only write, send them as one message
+            for k, v in cfg.items():
+                if k not in supported_cfg_keywords:
+                    logging.warning(f"{k} is not a supported cfg keyword. Ignore. Supported: {supported_cfg_keywords}")
+                elif k == 'wl' and cfg["wl"] is not None:
+                    self.set_wl_nm(cfg["wl"])
+                elif k == 'freq' and cfg["freq"] is not None:
+                    self.set_freq_THz(cfg["freq"])
+                elif k == 'pwr_unit' and cfg["pwr_unit"] is not None:
+                    self.pwr_unit = cfg["pwr_unit"]
+                elif k == 'avg_time' and cfg["avg_time"] is not None:
+                    self.set_avg_time_s(cfg["avg_time"])
+                elif k == 'pwr_range' and cfg["pwr_range"] is not None:
+                    self.set_pwr_range_dBm(cfg["pwr_range"])
+                elif k == 'pwr_range_auto' and cfg["pwr_range_auto"] is not None:
+                    self.set_pwr_range_auto(cfg["pwr_range_auto"])
+                elif k == 'offset' and cfg["offset"] is not None:
+                    self.set_offset(cfg["offset"])
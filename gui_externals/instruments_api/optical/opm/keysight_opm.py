@@ -13,16 +13,24 @@ class Pwm(AbsPWM):
         self._interface = interface
         self._channel = channel
         self._offset = offset
-        self._unit = "dBm"
+        self._unit = None  # known once set or read, served from here unless verify_cfg
+        self.verify_cfg = False
 
     @property
     def idn(self) -> str:
         """ Instrument identification string """
         return self._interface.query("*IDN?")
 
+    def reset(self):
+        """ Resets the power meter to its default settings, the cached power unit is forgotten """
+        self._interface.write("*RST")
+        self._unit = None
+
     @property
     def pwr_unit(self) -> str:
         """ Power unit of the sensor. """
+        if self._unit is not None and not self.verify_cfg:
+            return self._unit
         unit = int(self._interface.query(f":SENSe{self._channel}:POW:UNIT?"))
         unit_dict = {0: "dBm", 1: "W"}
         unit = unit_dict[unit]
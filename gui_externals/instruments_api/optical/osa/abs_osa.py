@@ -1,4 +1,5 @@
 import abc
+import numpy as np
 
 
 class InstrErrorOSA(Exception):
@@ -18,6 +19,61 @@ def nm_to_THz(wvl):
 C = 299792458.0  # speed of light
 
 
+def locate_center(freq, pwr, threshold, index_max=None) -> dict:
+    """
+    Center of the peak between the points where the power falls threshold dB below it.
+
+    The crossings are searched outward from the peak on boolean masks and linearly interpolated
+    between the samples around them. A side without crossing ends at the edge of the spectrum.
+    :param freq: Frequency array in THz
+    :param pwr: Power array in dBm
+    :param threshold: float, in dB. Level of the edges below the peak power
+    :param index_max: Optional index of the peak, default the maximum of pwr
+    :return data: dictionary. Keys: 'freq_THz', 'pwr_dBm', 'index'
+    """
+    freq = np.asarray(freq, dtype=np.float64)
+    pwr = np.asarray(pwr, dtype=np.float64)
+    if index_max is None:
+        index_max = int(np.argmax(pwr))
+    level = pwr[index_max] - threshold
+    below = pwr <= level
+    below[index_max] = False  # the peak is never an edge, even with threshold <= 0
+
+    # left crossing: first point below the level walking down from the peak, between it and the next one
+    left = below[index_max::-1]
+    i = int(np.argmax(left))
+    if left[i]:
+        a = index_max - i
+        rise = pwr[a + 1] - pwr[a]
+        t = (level - pwr[a]) / rise if rise else 0.0
+        pos_left = a + t
+        freq_left = freq[a] + t * (freq[a + 1] - freq[a])
+    else:
+        pos_left = 0
+        freq_left = freq[0]
+
+    # right crossing: first point below the level walking up from the peak, between the previous one and it
+    right = below[index_max:]
+    i = int(np.argmax(right))
+    if right[i]:
+        b = index_max + i
+        rise = pwr[b - 1] - pwr[b]
+        t = (level - pwr[b]) / rise if rise else 0.0
+        pos_right = b - t
+        freq_right = freq[b] + t * (freq[b - 1] - freq[b])
+    else:
+        pos_right = len(pwr) - 1
+        freq_right = freq[-1]
+
+    index_center = int(round((pos_left + pos_right) / 2))
+    data = {
+        'freq_THz': (freq_left + freq_right) / 2,
+        'pwr_dBm': pwr[index_center],
+        'index': index_center
+    }
+    return data
+
+
 class AbsOSA(metaclass=abc.ABCMeta):
 
     @property
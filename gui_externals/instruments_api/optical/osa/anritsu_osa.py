@@ -1,12 +1,15 @@
 import numpy as np
 import time
 from .abs_osa import AbsOSA
+from .abs_osa import locate_center
 from .abs_osa import InstrErrorOSA
 from .abs_osa import THz_to_nm
 from .abs_osa import nm_to_THz
 import logging
 logger = logging.getLogger(__name__)
 
+TRACE_DTYPE = np.dtype('>f4')  # REAL,32 trace points, big-endian (normal byte order)
+
 
 class Osa(AbsOSA):
     """
@@ -24,6 +27,7 @@ class Osa(AbsOSA):
         self._freq_max_THz = nm_to_THz(600)     # maximum readable frequency
         self._freq_min_THz = nm_to_THz(1750)    # minimum readable frequency
         self._rbw_supported = [0.03, 0.05, 0.07, 0.1, 0.2, 0.5, 1.0]  # in nm
+        self._geometry = None                   # (trace, frequency axis) of the last read trace
 
     @property
     def idn(self) -> str:
@@ -43,6 +47,7 @@ class Osa(AbsOSA):
             raise InstrErrorOSA(f'RBW = {rbw} nm is not supported.')
         self._interface.write(f":SENS:BWID:RES {rbw}NM")
         self._rbw = rbw
+        self.clear_geometry()
 
     @property
     def rbw_supported(self) -> list:
@@ -108,6 +113,7 @@ class Osa(AbsOSA):
         """ in nm """
         self._interface.write(f":SENS:WAV:STAR {start:0.1f}NM")
         self._interface.write(f":SENS:WAV:STOP {stop:0.1f}NM")
+        self.clear_geometry()
 
     def get_wl_start_stop_nm(self):
         """" in nm """
@@ -120,6 +126,7 @@ class Osa(AbsOSA):
         """ in nm """
         self._interface.write(f":SENS:WAV:CENT {center:0.2f}NM")
         self._interface.write(f":SENS:WAV:SPAN {span:0.1f}NM")
+        self.clear_geometry()
 
     def get_wl_center_span_nm(self):
         """" in nm """
@@ -176,6 +183,34 @@ class Osa(AbsOSA):
         }
         return spectrum
 
+    def clear_geometry(self):
+        """ Forgets the cached sweep geometry, it is queried again by the next get_data """
+        self._geometry = None
+
+    def get_geometry(self) -> tuple:
+        """
+        Active trace and its frequency axis (THz, ascending wavelength order),
+        cached until the span or the RBW setters change them
+        """
+        if self._geometry is None:
+            trace = self._interface.query(":TRAC:ACT?")[-1]
+            n = int(self._interface.query(f":TRAC:SNUM? {trace}"))
+            freq_start = nm_to_THz(float(self._interface.query(f":TRAC:DATA:X:STOP? {trace}")) * 1e9)
+            freq_stop = nm_to_THz(float(self._interface.query(f":TRAC:DATA:X:STAR? {trace}")) * 1e9)
+            self._geometry = (trace, np.linspace(freq_stop, freq_start, n))
+        return self._geometry
+
+    def _read_trace(self, trace) -> np.ndarray:
+        """ Y points of the trace in dBm, as a REAL,32 binary block if the interface can read one """
+        if not hasattr(self._interface, 'read_binary_block'):
+            return np.fromstring(self._interface.query(f":TRAC:DATA:Y? {trace}"), sep=',')
+        self._interface.write(f":FORM:DATA REAL,32;:TRAC:DATA:Y? {trace}")
+        try:
+            block = self._interface.read_binary_block()
+        finally:
+            self._interface.write(":FORM:DATA ASC")
+        return np.frombuffer(block, dtype=TRACE_DTYPE).astype(np.float64)
+
     def get_data(self):
         """
         Returns a dictionary with the spectral data of the last sweep
@@ -184,17 +219,14 @@ class Osa(AbsOSA):
             'pwr_dBm': ...,
         }
         """
-        trace = self._interface.query(":TRAC:ACT?")[-1]
-        n = int(self._interface.query(f":TRAC:SNUM? {trace}"))
-        freq_start = nm_to_THz(float(self._interface.query(f":TRAC:DATA:X:STOP? {trace}")) * 1e9)
-        freq_stop = nm_to_THz(float(self._interface.query(f":TRAC:DATA:X:STAR? {trace}")) * 1e9)
-        freq = np.linspace(freq_stop, freq_start, n)
-        data = self._interface.query(f":TRAC:DATA:Y? {trace}").split(",")
-        pwr_dBm = []
-        for point in data:
-            if point != '':
-                pwr_dBm.append(float(point))
-        pwr_dBm = np.array(pwr_dBm)
+        trace, freq = self.get_geometry()
+        pwr_dBm = self._read_trace(trace)
+        if len(pwr_dBm) != len(freq):
+            # sampling changed by a setting not tracked by the driver
+            self.clear_geometry()
+            trace, freq = self.get_geometry()
+            if len(pwr_dBm) != len(freq):
+                raise InstrErrorOSA(f'Trace {trace} has {len(pwr_dBm)} points, expected {len(freq)}')
 
         self._data['freq_THz'] = freq[::-1]
         self._data['pwr_dBm'] = pwr_dBm[::-1]
@@ -204,7 +236,8 @@ class Osa(AbsOSA):
 
     def find_center(self, freq=None, pwr=None, threshold=1.5, freq_center=None):
         """
-        Searches the maximum power in the spectrum and returns the corresponding power, frequency and index.
+        Searches the maximum power in the spectrum (or the point nearest to freq_center) and returns
+        the center between the points threshold dB below it.
         :return data: dictionary. Keys: 'freq_THz', 'pwr_dBm', 'index'
         """
         if freq is None or pwr is None:
@@ -212,43 +245,10 @@ class Osa(AbsOSA):
             freq = data['freq_THz']
             pwr = data['pwr_dBm']
 
+        index_max = None
         if freq_center is not None:
-            freq_pwr_max = freq_center
-            index_max = np.argmin(np.abs(freq-freq_pwr_max))
-            pwr_max = pwr[index_max]
-        else:
-            pwr_max = np.max(pwr)
-            index_max = np.argmax(pwr)
-            # freq_pwr_max = freq[index_max]
-
-        # left and right side indexes
-        index_left = 0
-        for i in np.arange(index_max, -1, -1):
-            _pwr = pwr[i]
-            if pwr_max - threshold >= _pwr:
-                index_left = i
-                break
-
-        index_right = len(pwr)
-        for i in np.arange(index_max, len(pwr)):
-            _pwr = pwr[i]
-            if pwr_max - threshold >= _pwr:
-                index_right = i
-                break
-        freq_left = freq[index_left]
-        freq_right = freq[index_right]
-
-        # central frequency and power
-        freq_center = (freq_left + freq_right) / 2
-        index_center = round((index_left + index_right) / 2)
-        power_center = pwr[index_center]
-
-        data = {
-            'freq_THz': freq_center,
-            'pwr_dBm': power_center,
-            'index': index_center
-            }
-        return data
+            index_max = int(np.argmin(np.abs(np.asarray(freq) - freq_center)))
+        return locate_center(freq, pwr, threshold, index_max)
 
     def evaluate_six_points(self, sig1, sig2, nl1, nl2, nr1, nr2):
         """
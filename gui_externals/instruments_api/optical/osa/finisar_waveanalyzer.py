@@ -3,16 +3,139 @@
 # 2021-09-07: First version. Robert Palmer
 #####################################################################################
 import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 import numpy as np
 import json
 import scipy
 from .abs_osa import AbsOSA
+from .abs_osa import locate_center
 from .abs_osa import THz_to_nm
 from .abs_osa import nm_to_THz
 import logging
 logger = logging.getLogger(__name__)
 
 
+class ScanWatcher:
+    """
+    Detects new WaveAnalyzer scans with few status requests.
+
+    The scan period is estimated from the observed scan id changes (EWMA). A wait sleeps until shortly
+    before the next scan is expected and only then polls every min_poll, with a backoff up to a
+    quarter of the period (at most max_poll) while the scan is late or the period is still unknown.
+    """
+
+    def __init__(self, get_scan_id, min_poll: float = 0.01, max_poll: float = 0.25, smoothing: float = 0.3):
+        """
+        :param get_scan_id: Callable returning the current scan id
+        :param min_poll: Shortest interval between two status requests (s)
+        :param max_poll: Longest interval between two status requests (s)
+        :param smoothing: EWMA weight of a new scan period measurement
+        """
+        self._get_scan_id = get_scan_id
+        self.min_poll = min_poll
+        self.max_poll = max_poll
+        self.smoothing = smoothing
+        self.scan_id = None
+        self.period = None          # estimated scan period (s)
+        self.polls = 0              # number of status requests
+        self._changed_at = None     # estimated time of the last scan id change (monotonic s)
+        self._polled_at = None
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _max_interval(self) -> float:
+        if self.period is None:
+            return self.max_poll
+        return max(self.min_poll, min(self.max_poll, self.period / 4))
+
+    def poll(self):
+        """ Reads the scan id and updates the scan period estimate """
+        with self._lock:
+            scan_id = self._get_scan_id()
+            now = time.monotonic()
+            self.polls += 1
+            if self.scan_id is not None and scan_id != self.scan_id:
+                try:
+                    scans = max(1, int(scan_id) - int(self.scan_id))
+                except (TypeError, ValueError):
+                    scans = 1
+                # the change happened since the previous poll, it is only timed if that poll is recent
+                if now - self._polled_at <= 1.5 * self._max_interval():
+                    changed_at = (self._polled_at + now) / 2
+                    if self._changed_at is not None:
+                        period = (changed_at - self._changed_at) / scans
+                        if self.period is None:
+                            self.period = period
+                        else:
+                            self.period = self.smoothing * period + (1 - self.smoothing) * self.period
+                    self._changed_at = changed_at
+                else:
+                    if self.period is not None and self._changed_at is not None:
+                        # keep the estimate consistent with the interval in which the change happened
+                        low = (self._polled_at - self._changed_at) / scans
+                        high = (now - self._changed_at) / scans
+                        self.period = min(max(self.period, low), high)
+                    self._changed_at = None
+            self.scan_id = scan_id
+            self._polled_at = now
+            return scan_id
+
+    def _expected_in(self, now: float):
+        """ Time until the next scan id change is expected (s, negative if overdue), None if unknown """
+        if self.period is None or self._changed_at is None:
+            return None
+        return self._changed_at + self.period - now
+
+    def wait(self, timeout: float = 1.0):
+        """
+        Waits for a scan id different from the current one
+        :param timeout: float, in seconds
+        :return: New scan id, None on timeout
+        """
+        deadline = time.monotonic() + timeout
+        scan_id = self.poll()
+        interval = self.min_poll
+        while True:
+            now = time.monotonic()
+            expected_in = self._expected_in(now)
+            margin = max(2 * self.min_poll, self.period / 16) if self.period else self.min_poll
+            if expected_in is not None and expected_in > margin:
+                delay = expected_in - margin  # sleep until shortly before the expected change
+            elif expected_in is not None and expected_in > -margin:
+                delay = self.min_poll  # poll fast around the expected change
+            else:
+                delay = interval  # unknown or late scan: back off
+                interval = min(2 * interval, self._max_interval())
+            delay = min(delay, deadline - now)
+            if delay <= 0:
+                return None
+            time.sleep(delay)
+            if self.poll() != scan_id:
+                return self.scan_id
+
+    def reset(self):
+        """ Forgets the scan timing, e.g. after a change of the scan settings """
+        with self._lock:
+            self.period = None
+            self._changed_at = None
+
+    def next_scan(self, timeout: float = 1.0) -> Future:
+        """
+        Waits for the next scan in a background thread
+        :param timeout: float, in seconds
+        :return: concurrent.futures.Future of the new scan id (None on timeout)
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='WaveAnalyzerScan')
+        return self._executor.submit(self.wait, timeout)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
 class Osa(AbsOSA):
     def __init__(self, interface, port='HighSens'):
         """ initializes Finisar WaveAnalyzer
@@ -36,6 +159,7 @@ class Osa(AbsOSA):
         self.noise_bw = 0.1     # noise bandwidth in nm, only for calculations of OSNR.
         self.average = 1        # number of captures to be averaged
         self._idn = ', '.join(list(json.loads(self._interface.query("/wanl/info")).values())[1:])
+        self._scan_watcher = ScanWatcher(self.get_scan_id)
         self._freq_max_THz = 196.4  # maximum readable frequency
         self._freq_min_THz = 191.0  # minimum readable frequency
         self._rbw_supported = [self._rbw]  # in nm
@@ -86,6 +210,7 @@ class Osa(AbsOSA):
         center = (start + stop) / 2
         span = stop - start
         self._interface.write(f"/wanl/scan/{int(center * 1e6)}/{int(span * 1e6)}/{self.port}")
+        self._scan_watcher.reset()  # the scan period depends on the span
 
     def get_freq_center_span_THz(self):
         self.sweep()
@@ -158,45 +283,16 @@ class Osa(AbsOSA):
 
     def find_center(self, freq_array=None, power_array=None, threshold=5):
         """
-        Searches the maximum power in the spectrum and returns the corresponding power, frequency and index.
+        Searches the maximum power in the spectrum and returns the center between the points threshold dB below it.
+        Uses the last sweep, sweeps only if there is no data yet.
         :return data: dictionary. Keys: 'freq_THz', 'pwr_dBm', 'index'
         """
         if freq_array is None or power_array is None:
-            self.sweep()
+            if len(self._data['freq_THz']) == 0:
+                self.sweep()
             freq_array = self._data['freq_THz']
             power_array = self._data['pwr_dBm']
-        pow_max = np.max(power_array)
-        index_max = np.argmax(power_array)
-        # freq_pow_max = freq_array[index_max]
-
-        # left and right side indexes
-        index_left = 0
-        for i in np.arange(index_max, -1, -1):
-            _pwr = power_array[i]
-            if pow_max - threshold >= _pwr:
-                index_left = i
-                break
-
-        index_right = len(power_array)
-        for i in np.arange(index_max, len(power_array)):
-            _pwr = power_array[i]
-            if pow_max - threshold >= _pwr:
-                index_right = i
-                break
-        freq_left = freq_array[index_left]
-        freq_right = freq_array[index_right]
-
-        # central frequency and power
-        freq_center = (freq_left + freq_right) / 2
-        index_center = round((index_left + index_right) / 2)
-        power_center = power_array[index_center]
-
-        data = {
-            'freq_THz': freq_center,
-            'pwr_dBm': power_center,
-            'index': index_center
-            }
-        return data
+        return locate_center(freq_array, power_array, threshold)
 
     def get_osnr(self, noise_ofs=None, signal_bw=None, freq_signal=None):
         """
@@ -217,6 +313,7 @@ class Osa(AbsOSA):
         if noise_ofs is None:
             noise_ofs = self.noise_ofs
         if freq_signal is None:
+            self.sweep()  # find_center() only sweeps without data, the signal is searched in a new sweep
             found_center = self.find_center()
             freq_signal = found_center['freq_THz']
         wvl_signal = THz_to_nm(freq_signal)
@@ -301,6 +398,7 @@ class Osa(AbsOSA):
         if noise_ofs is None:
             noise_ofs = self.noise_ofs
         if freq_signal is None:
+            self.sweep()  # find_center() only sweeps without data, the signal is searched in a new sweep
             found_center = self.find_center()
             freq_signal = found_center['freq_THz']
         wvl_signal = THz_to_nm(freq_signal)
@@ -431,13 +529,22 @@ class Osa(AbsOSA):
         :param timeout: float, in seconds
         :return:
         """
-        start_time = time.time()
-        scan_id = self.get_scan_id()
-        while time.time()-start_time < timeout and self.get_scan_id() == scan_id:
-            time.sleep(0.01)
-        if time.time()-start_time > timeout:
+        if self._scan_watcher.wait(timeout) is None:
             logger.warning('WaveAnalyzer timed out when waiting for a unique scan id. Ignore for now.')
 
+    def next_scan(self, timeout=1) -> Future:
+        """
+        Future of the id of the next completed scan (None on timeout), waited for in a background thread
+        :param timeout: float, in seconds
+        :return:
+        """
+        return self._scan_watcher.next_scan(timeout)
+
+    @property
+    def scan_period(self):
+        """ Estimated scan period in seconds, None until two scan id changes were observed """
+        return self._scan_watcher.period
+
     def get_scan_id(self):
         """
         Get the ID of the current OSA scan
@@ -525,6 +632,7 @@ class Osa(AbsOSA):
         return data
 
     def close(self):
+        self._scan_watcher.close()
         self.__del__()
 
     def __del__(self):
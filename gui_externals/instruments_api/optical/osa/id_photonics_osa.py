@@ -1,5 +1,7 @@
 import numpy as np
 from .abs_osa import AbsOSA
+from .abs_osa import locate_center
+from .abs_osa import InstrErrorOSA
 from .abs_osa import THz_to_nm
 from .abs_osa import nm_to_THz
 import logging
@@ -40,8 +42,7 @@ class Osa(AbsOSA):
         if num_avg is None:
             num_avg = self.average
 
-        timeout = kwargs.get('timeout', 2)
-        self._data = self.get_data(num_avg=num_avg, timeout=timeout)
+        self._data = self.get_data(num_avg=num_avg)
 
     def set_freq_start_stop_THz(self, start, stop):
         """ Sets start and stop frequency in THz. """
@@ -124,45 +125,16 @@ class Osa(AbsOSA):
 
     def find_center(self, freq_array=None, power_array=None, threshold=5):
         """
-        Searches the maximum power in the spectrum and returns the corresponding power, frequency and index.
+        Searches the maximum power in the spectrum and returns the center between the points threshold dB below it.
+        Uses the last sweep, sweeps only if there is no data yet.
         :return data: dictionary. Keys: 'freq_THz', 'pwr_dBm', 'index'
         """
         if freq_array is None or power_array is None:
-            self.sweep()
+            if len(self._data['freq_THz']) == 0:
+                self.sweep()
             freq_array = self._data['freq_THz']
             power_array = self._data['pwr_dBm']
-        pow_max = np.max(power_array)
-        index_max = np.argmax(power_array)
-        # freq_pow_max = freq_array[index_max]
-
-        # left and right side indexes
-        index_left = 0
-        for i in np.arange(index_max, -1, -1):
-            _pwr = power_array[i]
-            if pow_max - threshold >= _pwr:
-                index_left = i
-                break
-
-        index_right = len(power_array)
-        for i in np.arange(index_max, len(power_array)):
-            _pwr = power_array[i]
-            if pow_max - threshold >= _pwr:
-                index_right = i
-                break
-        freq_left = freq_array[index_left]
-        freq_right = freq_array[index_right]
-
-        # central frequency and power
-        freq_center = (freq_left + freq_right) / 2
-        index_center = round((index_left + index_right) / 2)
-        power_center = power_array[index_center]
-
-        data = {
-            'freq_THz': freq_center,
-            'pwr_dBm': power_center,
-            'index': index_center
-        }
-        return data
+        return locate_center(freq_array, power_array, threshold)
 
     def get_osnr(self, noise_ofs=None, signal_bw=None, freq_signal=None):
         """
@@ -183,6 +155,7 @@ class Osa(AbsOSA):
         if noise_ofs is None:
             noise_ofs = self.noise_ofs
         if freq_signal is None:
+            self.sweep()  # find_center() only sweeps without data, the signal is searched in a new sweep
             found_center = self.find_center()
             freq_signal = found_center['freq_THz']
         wvl_signal = THz_to_nm(freq_signal)
@@ -268,6 +241,7 @@ class Osa(AbsOSA):
         if noise_ofs is None:
             noise_ofs = self.noise_ofs
         if freq_signal is None:
+            self.sweep()  # find_center() only sweeps without data, the signal is searched in a new sweep
             found_center = self.find_center()
             freq_signal = found_center['freq_THz']
         wvl_signal = THz_to_nm(freq_signal)
@@ -301,62 +275,40 @@ class Osa(AbsOSA):
         pow_int = dwvl * np.sum(power[i_stop:i_start]) / self._rbw_THz
         return pow_int
 
-    def get_data(self, num_avg=None, timeout=1):
+    def get_data(self, num_avg=None):
         """
         Read averaged spectrum in linear or logarithmic units.
         :param num_avg: integer - Number of averages
-        :param timeout: float, in seconds - timeout waiting for a unique scan id
         :return data: dictionary. See get_data()
         """
-        data = self.get_data_raw(timeout=timeout)
+        data = self.get_data_raw()
         if num_avg is None:
             num_avg = self.average
 
         if num_avg > 1:
+            pwr_mW = data["pwr_mW"]  # accumulator, owned by this call
             for i in range(1, num_avg):
-                _data = self.get_data_raw(timeout=timeout)
-                data["pwr_mW"] = data["pwr_mW"] + _data["pwr_mW"]
-            data["pwr_mW"] = data["pwr_mW"] / num_avg
+                _, _pwr_mW = self._read_scan_retry()
+                if len(_pwr_mW) != len(pwr_mW):
+                    raise InstrErrorOSA(f'ID OSA scan size changed while averaging: {len(_pwr_mW)} != {len(pwr_mW)}')
+                pwr_mW += _pwr_mW
+            pwr_mW /= num_avg
 
-        data["pwr_dBm"] = 10 * np.log10(abs(data["pwr_mW"]))
+        data["pwr_dBm"] = 10 * np.log10(np.abs(data["pwr_mW"]))
 
         self._data = data
 
         return data
 
-    def get_data_raw(self, timeout=1):
+    def get_data_raw(self):
         """
         Get measured spectrum from OSA. Power will be in dBm or mW depending on selected 'unit'.
-        :param timeout: float, in seconds - timeout waiting for a unique scan id
         :return data_dict: dictionary. Keys: 'freq_THz', 'pwr_mW'
         """
         # disable internal averaging
         self._interface.write("AVER:SCANCOUN 1")
 
-        # initialize output variables
-        freq = []
-        p_abs = []
-
-        # get data
-        num_trials_remain = 5
-        y_lin_total = 0
-        while num_trials_remain:
-            try:
-                num_trials_remain -= 1
-                self._interface.write("SGL")
-                x = self._interface.query("xauto?")
-                y = self._interface.query("y?")
-                freq = np.array(map(float, x[:-1].split(','))) * 1e-12  # in THz
-                y = np.array(map(float, y[:-1].split(',')))
-                y_lin = np.array([10 ** (0.1 * yy) for yy in y])  # in mW
-                p_abs = y_lin_total + y_lin
-                break
-            # TODO: find what exception is raised
-            except Exception:
-                logger.warning('Reading ID OSA data failed. Repeat.')
-        if num_trials_remain <= 1:
-            raise Exception('ID OSA Error. Reading the data failed continuously.')
-
+        freq, p_abs = self._read_scan_retry()
         data_dict = {
             "freq_THz": freq,
             "pwr_mW": p_abs,
@@ -364,6 +316,26 @@ class Osa(AbsOSA):
 
         return data_dict
 
+    def _read_scan_retry(self, num_trials=5):
+        for _ in range(num_trials):
+            try:
+                return self._read_scan()
+            except Exception as e:
+                logger.warning(f'Reading ID OSA data failed. Repeat. {e}')
+        raise InstrErrorOSA('ID OSA Error. Reading the data failed continuously.')
+
+    def _read_scan(self):
+        """
+        Single scan
+        :return: (frequency in THz, power in mW) as float64 arrays
+        """
+        self._interface.write("SGL")
+        freq = np.fromstring(self._interface.query("xauto?").strip().rstrip(','), sep=',') * 1e-12  # in THz
+        pwr_dBm = np.fromstring(self._interface.query("y?").strip().rstrip(','), sep=',')
+        if len(freq) == 0 or len(freq) != len(pwr_dBm):
+            raise InstrErrorOSA(f'{len(freq)} frequencies and {len(pwr_dBm)} power values received')
+        return freq, 10 ** (0.1 * pwr_dBm)  # in mW
+
     def close(self):
         self.__del__()
 
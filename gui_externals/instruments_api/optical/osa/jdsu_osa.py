@@ -4,6 +4,7 @@ from .abs_osa import AbsOSA
 from .abs_osa import InstrErrorOSA
 from .abs_osa import THz_to_nm
 from .abs_osa import nm_to_THz
+from ...interfaces.scpi_batch import batch_of, batched
 import logging
 logger = logging.getLogger(__name__)
 
@@ -25,6 +26,7 @@ class Osa(AbsOSA):
         self._average = None
         self._mode = None
         self._data = {'freq_THz': np.array([]), 'pwr_mW': np.array([]), 'pwr_dBm': np.array([])}
+        self._trace_scale = None                # (xscale, xoffset, yscale, yoffset) of the trace buffer
         self._freq_max_THz = 239.834            # maximum readable frequency
         self._freq_min_THz = 181.692            # minimum readable frequency
         self._rbw_supported = {0.07: "FULL",
@@ -38,14 +40,15 @@ class Osa(AbsOSA):
                                5.0: "R5N"}
         rbw_supported_inv = {self._rbw_supported[key]: key for key in self._rbw_supported.keys()}  # inverted dictionary
 
-        # OSA initialization
-        self._interface.write("*REM")
-        self._interface.write("OSAS:DEFAULT")
-        self._interface.write("OSAS:SEACQ SEMAN")
-        self._interface.write("OSAS:UNIT THZ")
+        # OSA initialization, the settings are sent as one message
+        with batched(self) as batch:
+            batch.write("*REM")
+            batch.write(":OSAS:DEFAULT")
+            batch.write(":OSAS:SEACQ SEMAN")
+            batch.write(":OSAS:UNIT THZ")
+            self.average = 1                                                # number of captures to be averaged
+            self.mode = "SINGLE"                                            # sweep mode of the OSA
         self._rbw = rbw_supported_inv[self._interface.query("OSAS:RESO?")]  # rbw of the instrument
-        self.average = 1                                                    # number of captures to be averaged
-        self.mode = "SINGLE"                                                # sweep mode of the OSA
 
     @property
     def idn(self) -> str:
@@ -65,6 +68,7 @@ class Osa(AbsOSA):
             raise InstrErrorOSA(f'RBW = {rbw} nm is not supported. Supported values are {self.rbw_supported}')
         self._interface.write(f"OSAS:RESO {self.rbw_supported[rbw]}")
         self._rbw = rbw
+        self.clear_trace_scale()
 
     @property
     def rbw_supported(self) -> dict:
@@ -82,7 +86,7 @@ class Osa(AbsOSA):
         avg_supported = {1: "NO", 2: "LOW", 3: "MED", 4: "HIGH"}
         if average not in avg_supported.keys():
             raise InstrErrorOSA(f'AVG = {average} is not supported. Supported values are {avg_supported.keys()}')
-        self._interface.write(f"OSAS:AVG {avg_supported[average]}")
+        self._interface.write(f":OSAS:AVG {avg_supported[average]}")
         self._average = average
 
     @property
@@ -95,7 +99,7 @@ class Osa(AbsOSA):
         mode_supported = {"CONT": 0, "SINGLE": 1}
         if mode not in mode_supported.keys():
             raise InstrErrorOSA(f'{mode} is not supported. Supported values are {mode_supported.keys()}')
-        self._interface.write(f"OSAS:MODE {mode_supported[mode]}")
+        self._interface.write(f":OSAS:MODE {mode_supported[mode]}")
         self._mode = mode
 
     def sweep(self, num_avg=1, wait_until_finished=True):
@@ -131,6 +135,7 @@ class Osa(AbsOSA):
         self._interface.write(f"OSAS:MSSCREEN {start:3f}")
         self._interface.write(f"OSAS:MEACQ {stop:3f}")
         self._interface.write(f"OSAS:MESCREEN {stop:3f}")
+        self.clear_trace_scale()
 
     def get_freq_start_stop_THz(self):
         """" in THz """
@@ -146,7 +151,7 @@ class Osa(AbsOSA):
             start = self._freq_min_THz
         if stop > self._freq_max_THz:
             stop = self._freq_max_THz
-        self.set_freq_center_span_THz(start, stop)
+        self.set_freq_start_stop_THz(start, stop)
 
     def get_freq_center_span_THz(self):
         """" in THz """
@@ -159,7 +164,7 @@ class Osa(AbsOSA):
         """ Sets start and stop wavelength in nm. """
         freq_start = nm_to_THz(stop)
         freq_stop = nm_to_THz(start)
-        self.set_freq_center_span_THz(freq_start, freq_stop)
+        self.set_freq_start_stop_THz(freq_start, freq_stop)
 
     def get_wl_start_stop_nm(self):
         """" in nm """
@@ -220,37 +225,44 @@ class Osa(AbsOSA):
             time.sleep(0.2)
             t1 = time.time()
 
-    def get_data(self):
-        data = {'freq_THz': np.array([]), 'pwr_mW': np.array([]), 'pwr_dBm': np.array([])}
-        buffer = self._interface.query("CUR:BUFF?")
-
-        # get the offsets
-        yoffset = float(self._interface.query("CUR:YOFF?"))
-        yscale = float(self._interface.query("CUR:YSC?"))
-        xoffset = float(self._interface.query("CUR:XOFF?"))
-        xscale = float(self._interface.query("CUR:XSC?"))
-
-        # calculate expected length
+    def clear_trace_scale(self):
+        """ Forgets the X/Y scale and offset of the trace buffer, they are queried again by the next get_data """
+        self._trace_scale = None
+
+    def get_trace_scale(self) -> tuple:
+        """ (xscale, xoffset, yscale, yoffset) of the trace buffer, cached until the span or the RBW changes """
+        if self._trace_scale is None:
+            self._trace_scale = (float(self._interface.query("CUR:XSC?")),
+                                 float(self._interface.query("CUR:XOFF?")),
+                                 float(self._interface.query("CUR:YSC?")),
+                                 float(self._interface.query("CUR:YOFF?")))
+        return self._trace_scale
+
+    @staticmethod
+    def decode_buffer(buffer: str) -> np.ndarray:
+        """
+        Decodes a CUR:BUFF? reply: #<n digits><length><4 hex characters per point>
+        :param buffer: Reply string
+        :return: Raw points as signed 16-bit integers
+        """
         n_size_chars = int(buffer[1:2])
-        n_cols = int(int(buffer[2:2 + n_size_chars]) / 4)
+        n_cols = int(buffer[2:2 + n_size_chars]) // 4
         expected_length = (2 + n_size_chars + 4 * n_cols)
 
         if len(buffer) != expected_length:
             raise EOFError(f"Expected {expected_length} bytes, received {len(buffer)} bytes.")
 
-        pwr_dBm = []
-        for col in range(n_cols):
-            index = 4 * col + 2 + n_size_chars
-            valuestr = '0x' + buffer[index:index + 4]
-            value = int(valuestr, 16)
-            if value > (65536 / 2):
-                value -= 65536
-            value = yscale * value + yoffset
-            pwr_dBm.append(value)
-
-        data["freq_THz"] = np.arange(0, n_cols) * xscale + xoffset
-        data["pwr_dBm"] = np.asarray(pwr_dBm)
-        data["pwr_mW"] = 10 ** (np.asarray(pwr_dBm) / 10)
+        return np.frombuffer(bytes.fromhex(buffer[2 + n_size_chars:]), dtype='>i2')
+
+    def get_data(self):
+        data = {'freq_THz': np.array([]), 'pwr_mW': np.array([]), 'pwr_dBm': np.array([])}
+        raw = self.decode_buffer(self._interface.query("CUR:BUFF?"))
+        xscale, xoffset, yscale, yoffset = self.get_trace_scale()
+
+        pwr_dBm = yscale * raw + yoffset
+        data["freq_THz"] = np.arange(len(raw)) * xscale + xoffset
+        data["pwr_dBm"] = pwr_dBm
+        data["pwr_mW"] = 10 ** (pwr_dBm / 10)
         self._data = data
         return self._data
 
@@ -266,53 +278,49 @@ class Osa(AbsOSA):
     def get_smsr(self):
         """ returns data dictionary with multipeak SMSR data """
         data = {"freq_THz": np.array([]), "pwr_dBm": np.array([]), "smsr_dB": np.array([])}
-        freq, pwr, smsr = [], [], []
 
         elements, lines = self.get_table_data()
-        for line in lines:
-            items = line.split(',')
-            for ei, element in enumerate(elements):
-                if "freq" in element.lower():
-                    try:
-                        freq.append(float(items[ei]))
-                    except ValueError:
-                        freq.append(np.nan)
-                elif "power(dbm)" in element.lower():
-                    try:
-                        pwr.append(float(items[ei]))
-                    except ValueError:
-                        pwr.append(np.nan)
-                elif "smsr" in element.lower():
-                    try:
-                        smsr.append(float(items[ei]))
-                    except ValueError:
-                        smsr.append(np.nan)
-
-        # convert lists to numpy arrays
-        freq = np.asarray(freq)
-        pwr = np.asarray(pwr)
-        smsr = np.asarray(smsr)
-
-        if len(freq) > 0 and len(pwr) > 0 and len(smsr) > 0:
-            # sort list by power
-            data["freq_THz"] = freq[np.argsort(pwr)[::-1]]
-            data["pwr_dBm"] = np.sort(pwr)[::-1]
-            data["smsr_dB"] = smsr[np.argsort(pwr)[::-1]]
+        columns = {}
+        for name, key in (("freq_THz", "freq"), ("pwr_dBm", "power(dbm)"), ("smsr_dB", "smsr")):
+            matches = [ei for ei, element in enumerate(elements) if key in element.lower()]
+            if not matches:
+                return data
+            columns[name] = matches[0]
+        if not lines:
+            return data
+
+        # one parse of the whole table, non-numeric cells are NaN, a line with missing cells is an error
+        try:
+            values = np.genfromtxt(lines, delimiter=',', dtype=np.float64, ndmin=2, comments=None)
+        except ValueError as e:
+            raise InstrErrorOSA(f'Analysis table not parsed: {e}')
+        if len(values) != len(lines):
+            raise InstrErrorOSA(f'Analysis table of {len(lines)} lines (TAB:SIZ?) parsed into {len(values)} rows')
+        table = np.empty(len(values), dtype=[(name, np.float64) for name in columns])
+        for name, ei in columns.items():
+            table[name] = values[:, ei] if ei < values.shape[1] else np.nan
+
+        # sort by power, descending
+        table = table[np.argsort(table["pwr_dBm"])[::-1]]
+        for name in columns:
+            data[name] = table[name]
         return data
 
-    def get_table_data(self):
+    def _query_all(self, cmds: list) -> list:
+        """ Replies of the queries, pipelined in joined messages when the interface supports it """
+        with batch_of(self._interface) as batch:
+            replies = [batch.query(cmd) for cmd in cmds]
+        return [reply.result() for reply in replies]
 
-        data = self._interface.query("TAB:SIZ?")
+    def get_table_data(self):
+        """ Titles and lines of the analysis table, in 2 round-trips: size and titles, then all the lines """
+        data, titles = self._query_all([":TAB:SIZ?", ":TAB:TIT?"])
         try:
             n_lines = int(data)
         except Exception as e:
             n_lines = 0
             logger.error(e)
-        lines = []
-        for i in range(n_lines):
-            line = self._interface.query(f"TAB:LIN? {i+1}\n")
-            lines.append(line)
+        lines = self._query_all([f":TAB:LIN? {i + 1}" for i in range(n_lines)])
 
-        data = self._interface.query("TAB:TIT?")
-        elements = data.split(",")
+        elements = titles.split(",")
         return elements, lines
@@ -1,6 +1,8 @@
 import time
+from collections import deque
 
 from .abs_switch import AbsSwitch
+from .abs_switch import InstrErrorSwitch
 
 
 class Switch(AbsSwitch):
@@ -14,6 +16,8 @@ class Switch(AbsSwitch):
         if hasattr(self._interface, 'inst') and hasattr(self._interface.inst, 'read_termination'):
             self._interface.inst.read_termination = '\n'
         self.time_sleep = 0.1
+        self.settle_min_sleep = 0.005  # first poll interval of wait_settled, doubled up to time_sleep
+        self._settle_times = {}
         self._idn = self.idn()
 
     def set_config(self, cfg: dict = None):
@@ -73,6 +77,77 @@ class Switch(AbsSwitch):
             time.sleep(self.time_sleep)
         return self.opc()
 
+    def wait_settled(self, channel: int = None, timeout: float = 3, power_reader=None, stable_count: int = 3,
+                     tolerance: float = 0.05) -> float:
+        """
+        :param channel: expected channel after the operation, checked with "CLOSe?". None skips the check
+        :param timeout: maximum time in seconds to wait for the optical path to settle
+        :param power_reader: optional callable returning the optical power in dB/dBm, e.g. Pwm.get_pwr
+        :param stable_count: number of consecutive power readings required to lie within tolerance
+        :param tolerance: maximum spread in dB of the last stable_count power readings
+        :return:    settle time in seconds
+
+        Polls “STAT:OPER:COND?” with an adaptive backoff starting at settle_min_sleep and
+        doubling up to time_sleep, so a fast switch is seen as soon as it is done. When a
+        power_reader is given the path is only considered settled once stable_count
+        consecutive readings agree within tolerance. Every settle time is recorded per
+        channel, see get_settle_stats().
+
+        """
+        start_time = time.time()
+        delay = self.settle_min_sleep
+
+        def backoff(reason):
+            nonlocal delay
+            if time.time() - start_time > timeout:
+                raise InstrErrorSwitch(f"Switch not settled after {timeout} s: {reason}")
+            time.sleep(delay)
+            delay = min(delay * 2, self.time_sleep)
+
+        while not self.opc():
+            backoff("operation not complete")
+        if channel is not None:
+            while self.get_channel() != channel:
+                backoff(f"channel is not {channel}")
+        if power_reader is not None:
+            readings = deque(maxlen=max(int(stable_count), 1))
+            while True:
+                readings.append(power_reader())
+                if len(readings) == readings.maxlen and max(readings) - min(readings) <= tolerance:
+                    break
+                if time.time() - start_time > timeout:
+                    raise InstrErrorSwitch(f"Switch not settled after {timeout} s: power not stable {list(readings)}")
+
+        settle_time = time.time() - start_time
+        self._settle_times.setdefault(channel, []).append(settle_time)
+        return settle_time
+
+    def set_channel_settled(self, channel: int, **kwargs) -> float:
+        """
+        :param channel: integer number representing switch number in current module
+        :param kwargs: passed to wait_settled()
+        :return:    settle time in seconds
+        """
+        self.set_channel(channel)
+        return self.wait_settled(channel=channel, **kwargs)
+
+    def get_settle_stats(self) -> dict:
+        """
+        :return: Dictionary per channel with 'count', 'mean', 'min', 'max' and 'p95' settle times in seconds
+        """
+        stats = {}
+        for channel, times in self._settle_times.items():
+            times = sorted(times)
+            stats[channel] = {'count': len(times),
+                              'mean': sum(times) / len(times),
+                              'min': times[0],
+                              'max': times[-1],
+                              'p95': times[min(int(round(0.95 * (len(times) - 1))), len(times) - 1)]}
+        return stats
+
+    def clear_settle_stats(self):
+        self._settle_times = {}
+
     def set_channel(self, channel: int):
         """
         :param channel: integer number representing switch number in current
@@ -1,6 +1,8 @@
 import abc
 import logging
 
+from ...interfaces.scpi_batch import batched
+
 
 class InstrErrorVOA(Exception):
     pass
@@ -57,19 +59,20 @@ class AbsVOA(metaclass=abc.ABCMeta):
                         cfg:(dict) VOA configuration
                 """
         supported_cfg_keywords = ["wl", "freq", "out_state", "shutter", "atten"]
-        for k, v in cfg.items():
-            if k not in supported_cfg_keywords:
-                logging.warning(f"{k} is not a supported cfg keyword. Ignore. Supported: {supported_cfg_keywords}")
-            elif k == 'wl' and cfg['wl'] is not None:
-                self.set_wvl_nm(cfg['wl'])
-            elif k == 'freq' and cfg['freq'] is not None:
-                self.set_freq_THz(cfg['freq'])
-            elif k == 'out_state' and cfg['out_state'] is not None:
-                self.set_out_state(cfg['out_state'])
-            elif k == 'shutter' and cfg['shutter'] is not None:
-                self.set_out_state(not cfg['shutter'])
-            elif k == 'atten' and cfg['atten'] is not None:
-                self.set_atten(cfg['atten'])
+        with batched(self):  # the setters only write, send them as one message
+            for k, v in cfg.items():
+                if k not in supported_cfg_keywords:
+                    logging.warning(f"{k} is not a supported cfg keyword. Ignore. Supported: {supported_cfg_keywords}")
+                elif k == 'wl' and cfg['wl'] is not None:
+                    self.set_wvl_nm(cfg['wl'])
+                elif k == 'freq' and cfg['freq'] is not None:
+                    self.set_freq_THz(cfg['freq'])
+                elif k == 'out_state' and cfg['out_state'] is not None:
+                    self.set_out_state(cfg['out_state'])
+                elif k == 'shutter' and cfg['shutter'] is not None:
+                    self.set_out_state(not cfg['shutter'])
+                elif k == 'atten' and cfg['atten'] is not None:
+                    self.set_atten(cfg['atten'])
 
     def get_config(self) -> dict:
         cfg = {}
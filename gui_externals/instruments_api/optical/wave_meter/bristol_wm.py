@@ -1,12 +1,24 @@
 from __future__ import annotations
 
 import logging
-from struct import unpack
+from typing import NamedTuple
 import numpy as np
 from .abs_wm import AbsWM  # also thz_to_nm() and nm_to_thz()
 
 logger = logging.getLogger(__name__)
 
+MAX_MSG_LEN = 200  # max length of a semicolon-joined configuration message
+
+# :CALC3:DATA? sample: wavelength (nm) as little-endian double, power (dBm) as little-endian float
+SPECTRUM_DTYPE = np.dtype([('wavelength', '<f8'), ('power', '<f4')])
+
+
+class WlmSnapshot(NamedTuple):
+    """ Frequency, power and SMSR computed from the same scan """
+    freq: float  # THz
+    power: float  # in the unit set by set_pow_unit()
+    smsr: str | dict[str, float]  # as returned by get_smsr()
+
 
 class BristolWM(AbsWM):
     """ A class for Bristol Wavelength Meter """
@@ -25,6 +37,11 @@ class BristolWM(AbsWM):
         self._interface.prompt = '\r\n'
         self._interface.eol = '\r\n'
         self._method_str = 'MEAS'  # Options are: 'MEAS', 'READ', or 'FETCH'
+        # Configuration values recorded on set_* and served by get_* until *RST/*RCL.
+        # verify_cfg = True always queries the instrument and refreshes the cache
+        self._cfg_cache = {}
+        self.verify_cfg = False
+        self._pending = None  # commands collected by set_cfg(), None to send them directly
         if hasattr(self._interface, 'tn'):
             self._int_type = 'telnet'
         elif hasattr(self._interface, 's') and hasattr(self._interface, 'fragments_enabled'):
@@ -72,26 +89,77 @@ class BristolWM(AbsWM):
 
         for kw, _ in kwargs.items():
             if kw.lower() in cfg_list:
-                func_name = f'self.get_{kw.lower()}'
-                eval(func_name)()
+                getattr(self, f'get_{kw.lower()}')()
             else:
                 logger.warning(f'Not a valid setting to get: {kw}')
 
-    def set_cfg(self, **kwargs: dict[str, str | float]) -> None:
-        """ Sets a group of settings to the instrument """
-        cfg_list = [
-            'avg_stat', 'avg_cnt', 'pow_offset',
-            'wave_lmt_start', 'wave_lmt_end', 'meas_method',
-            'smsr_rng', 'smsr_excl', 'smsr_mode', 'pow_unit',
-            'wavelen_unit', 'smsr_stat'
-        ]
+    def set_cfg(self, **kwargs: dict[str, str | float]) -> bool:
+        """ Sets a group of settings to the instrument
 
-        for kw, val in kwargs.items():
-            if kw.lower() in cfg_list:
-                func_name = f'self.set_{kw.lower()}'
-                eval(func_name)(kwargs[kw])
-            else:
-                logger.warning(f'Not settable: {kw} = {val}')
+        Every setting is validated by its set_* method, the resulting
+        commands are sent as semicolon-joined messages of at most
+        MAX_MSG_LEN characters, the last one followed by a single *OPC?
+        """
+        setters = {
+            'avg_stat': self.set_avg_stat, 'avg_cnt': self.set_avg_cnt,
+            'pow_offset': self.set_pow_offset,
+            'wave_lmt_start': self.set_wave_lmt_start,
+            'wave_lmt_end': self.set_wave_lmt_end,
+            'meas_method': self.set_meas_method,
+            'smsr_rng': self.set_smsr_rng, 'smsr_excl': self.set_smsr_excl,
+            'smsr_mode': self.set_smsr_mode, 'pow_unit': self.set_pow_unit,
+            'wavelen_unit': self.set_wavelen_unit,
+            'smsr_stat': self.set_smsr_stat
+        }
+
+        msgs = []
+        self._pending = msgs  # the set_* methods collect their commands
+        try:
+            for kw, val in kwargs.items():
+                if kw.lower() in setters:
+                    setters[kw.lower()](val)
+                else:
+                    logger.warning(f'Not settable: {kw} = {val}')
+        finally:
+            self._pending = None
+
+        return self._write_batch(msgs)
+
+    def _write(self, msg: str):
+        """ Writes a command, or collects it while set_cfg() builds its messages """
+        if self._pending is not None:
+            self._pending.append(msg)
+            return None
+        return self._interface.write(msg)
+
+    def _write_batch(self, msgs: list[str]) -> bool:
+        """ Sends commands joined by ';' and confirms them with one *OPC? """
+        chunks = ['']
+        for msg in msgs:
+            if chunks[-1] and len(chunks[-1]) + len(msg) + 1 > MAX_MSG_LEN:
+                chunks.append('')
+            chunks[-1] = f'{chunks[-1]};{msg}' if chunks[-1] else msg
+        for chunk in chunks[:-1]:
+            self._interface.write(chunk)
+        last = f'{chunks[-1]};*OPC?' if chunks[-1] else '*OPC?'
+        is_done = self._interface.query(last).strip() == '1'
+        if not is_done:
+            logger.warning(f'Configuration not confirmed: {msgs}')
+        return is_done
+
+    def _cached_query(self, key: str, msg: str, convert=str):
+        """ Queries a configuration value, served from the cache if known """
+        if not self.verify_cfg and key in self._cfg_cache:
+            return self._cfg_cache[key]
+        value = convert(self._interface.query(msg))
+        if self.verify_cfg and key in self._cfg_cache and self._cfg_cache[key] != value:
+            logger.debug(f'{key}: cached {self._cfg_cache[key]}, instrument {value}')
+        self._cfg_cache[key] = value
+        return value
+
+    def clear_cfg_cache(self) -> None:
+        """ Forgets the cached configuration, e.g. after a change from the front panel """
+        self._cfg_cache.clear()
 
     def get_idn(self) -> str:
         msg = '*IDN?'
@@ -116,19 +184,21 @@ class BristolWM(AbsWM):
         """ Resets instrument to factory default settings """
         msg = '*RST'
 
-        self._interface.write(msg)
+        self._write(msg)
+        self._cfg_cache.clear()
 
     def restore_settings(self) -> None:
         """ Restores the most recently saved instrument settings """
         msg = '*RCL'
 
-        self._interface.write(msg)
+        self._write(msg)
+        self._cfg_cache.clear()
 
     def save_settings(self) -> None:
         """ Saves current instrument settings """
         msg = '*SAV'
 
-        self._interface.write(msg)
+        self._write(msg)
 
     def get_avg_stat(self) -> str:
         """ Queries state of the spectral averaging
@@ -139,7 +209,7 @@ class BristolWM(AbsWM):
         """
         msg = ':CALCulate2:AVER:STATe?'
 
-        return self._interface.query(msg)
+        return self._cached_query('avg_stat', msg)
 
     def set_avg_stat(self, avg_stat: str) -> bool:
         """ Sets state of the spectral averaging """
@@ -148,7 +218,8 @@ class BristolWM(AbsWM):
 
         if avg_stat in valid_val:
             msg = f':CALCulate2:AVER:STATe {avg_stat}'
-            self._interface.write(msg)
+            self._write(msg)
+            self._cfg_cache['avg_stat'] = avg_stat
             return True
         else:
             logger.warning(f'Not a valid averaging state to set: {avg_stat}')
@@ -160,7 +231,7 @@ class BristolWM(AbsWM):
         """
         msg = ':CALCulate2:AVER:COUNt?'
 
-        return self._interface.query(msg)
+        return self._cached_query('avg_cnt', msg)
 
     def set_avg_cnt(self, avg_cnt: int) -> bool:
         """ Sets the number of scans to collect
@@ -176,7 +247,9 @@ class BristolWM(AbsWM):
                            f'coerced to {self.avg_cnt_max}')
             avg_cnt = self.avg_cnt_max
         msg = f':CALCulate2:AVER:COUNt {avg_cnt}'
-        return self._interface.write(msg)
+        ret = self._write(msg)
+        self._cfg_cache['avg_cnt'] = str(avg_cnt)
+        return ret
 
     def get_freq(self) -> float:
         """ Reads the frequency """
@@ -187,7 +260,7 @@ class BristolWM(AbsWM):
     def get_medium(self) -> str:
         msg = ':SENS:MED?'
 
-        return self._interface.query(msg)
+        return self._cached_query('medium', msg)
 
     def set_medium(self, med: str) -> bool:
         valid_val = ['AIR', 'VAC']
@@ -195,7 +268,8 @@ class BristolWM(AbsWM):
         med = med.upper()
         if med in valid_val:
             msg = f':SENS:MED {med}'
-            self._interface.write(msg)
+            self._write(msg)
+            self._cfg_cache['medium'] = med
             return True
         else:
             logger.warning(f'Not a valid medium to set: {med}')
@@ -236,7 +310,7 @@ class BristolWM(AbsWM):
         """
         msg = ':UNIT:POW?'
 
-        return self._interface.query(msg)
+        return self._cached_query('pow_unit', msg)
 
     def set_pow_unit(self, unit: str) -> bool:
         """ Sets the power units
@@ -244,12 +318,13 @@ class BristolWM(AbsWM):
         Note: this refers to the unit that will be used
         when the SCPI interface returns calculated values
         """
-        valid_val = ['DBM', 'MW']
+        valid_val = {'DBM': 'dBm', 'MW': 'mW'}  # sent upper case, read back in the spelling of the instrument
 
         unit = unit.upper()
         if unit in valid_val:
             msg = f':UNIT:POW {unit}'
-            self._interface.write(msg)
+            self._write(msg)
+            self._cfg_cache['pow_unit'] = valid_val[unit]
             return True
         else:
             logger.warning(f'Not a valid unit to set: {unit}')
@@ -258,7 +333,7 @@ class BristolWM(AbsWM):
     def get_pow_offset(self) -> str:
         msg = ':SENS:POW:OFFS?'
 
-        return self._interface.query(msg)
+        return self._cached_query('pow_offset', msg)
 
     def set_pow_offset(self, offset: str) -> bool:
         valid_val = [str(n) for n in range(1, 21)]
@@ -267,7 +342,8 @@ class BristolWM(AbsWM):
         offset = offset.upper()
         if offset in valid_val:
             msg = f':SENS:POW:OFFS {offset}'
-            self._interface.write(msg)
+            self._write(msg)
+            self._cfg_cache['pow_offset'] = offset
             return True
         else:
             logger.warning(f'Not a valid power offset to set: {offset}')
@@ -287,7 +363,7 @@ class BristolWM(AbsWM):
         """
         msg = ':UNIT:WAV?'
 
-        return self._interface.query(msg)
+        return self._cached_query('wavelen_unit', msg)
 
     def set_wavelen_unit(self, unit: str) -> bool:
         """ Sets the wavelength units
@@ -300,7 +376,8 @@ class BristolWM(AbsWM):
 
         if unit in valid_val:
             msg = f':UNIT:WAV {unit}'
-            self._interface.write(msg)
+            self._write(msg)
+            self._cfg_cache['wavelen_unit'] = unit
             return True
         else:
             logger.warning(f'Not a valid unit to set: {unit}')
@@ -316,7 +393,7 @@ class BristolWM(AbsWM):
         """ Gets the starting wavelength in the spectrum """
         msg = ':CALC2:WLIM:STAR?'
 
-        return float(self._interface.query(msg))
+        return self._cached_query('wave_lmt_start', msg, float)
 
     def set_wave_lmt_start(self, wav: float) -> bool:
         """ Sets the starting wavelength in the spectrum """
@@ -327,13 +404,15 @@ class BristolWM(AbsWM):
             wav = self.wav_lmt_max
 
         msg = f':CALC2:WLIM:STAR {wav}'
-        return self._interface.write(msg)
+        ret = self._write(msg)
+        self._cfg_cache['wave_lmt_start'] = float(wav)
+        return ret
 
     def get_wave_lmt_end(self) -> float:
         """ Gets the ending wavelength in the spectrum """
         msg = ':CALC2:WLIM:STOP?'
 
-        return float(self._interface.query(msg))
+        return self._cached_query('wave_lmt_end', msg, float)
 
     def set_wave_lmt_end(self, wav: float) -> bool:
         """ Sets the ending wavelength in the spectrum """
@@ -346,7 +425,9 @@ class BristolWM(AbsWM):
             wav = self.wav_lmt_max
 
         msg = f':CALC2:WLIM:STOP {wav}'
-        return self._interface.write(msg)
+        ret = self._write(msg)
+        self._cfg_cache['wave_lmt_end'] = float(wav)
+        return ret
 
     def get_smsr(self, mode: str = '0') -> str | dict[str, float]:
         """ Returns the side mode suppression ratio (SMSR) values
@@ -357,15 +438,21 @@ class BristolWM(AbsWM):
         Mode 3: Lambda1, I1, Lambda-R, I-R, Lambda-B, I-B
         """
         msg = f':{self._method_str}:SMSR?'
-        smsr = {}
 
         smsr_raw = self._interface.query(msg)
         if smsr_raw == 'SMSR off':
             return smsr_raw
-        else:
-            if mode == '0':  # get SMSR mode if user doesn't provide it
-                mode = self.get_smsr_mode()
+        if mode == '0':  # get SMSR mode if user doesn't provide it
+            mode = self.get_smsr_mode()
+        return self._parse_smsr(smsr_raw, mode)
 
+    @staticmethod
+    def _parse_smsr(smsr_raw: str, mode: str) -> str | dict[str, float]:
+        """ Converts a SMSR reply to the dictionary of the given SMSR mode """
+        smsr = {}
+        if smsr_raw == 'SMSR off':
+            return smsr_raw
+        else:
             if mode == '1':
                 smsr['SMSR'] = float(smsr_raw.rsplit(',', 1)[1])
             elif mode == '2':
@@ -384,7 +471,7 @@ class BristolWM(AbsWM):
         """ Gets the mode of SMSR calculation """
         msg = ':CALCulate2:SMSR:MODE?'
 
-        return self._interface.query(msg)
+        return self._cached_query('smsr_mode', msg)
 
     def set_smsr_mode(self, mode: str) -> bool:
         """ Sets the mode of SMSR calculation """
@@ -392,12 +479,37 @@ class BristolWM(AbsWM):
 
         if mode in valid_val:
             msg = f':CALCulate2:SMSR:MODE {mode}'
-            self._interface.write(msg)
+            self._write(msg)
+            self._cfg_cache['smsr_mode'] = mode
             return True
         else:
             logger.warning(f'Not a valid SMSR mode to set: {mode}')
             return False
 
+    def get_snapshot(self, pipelined: bool = False) -> WlmSnapshot:
+        """ Reads frequency, power and SMSR from a single acquisition
+
+        READ triggers one new scan and returns its frequency,
+        power and SMSR are then FETCHed from the same scan.
+        With pipelined, the three queries are sent in one message
+        and the replies come back in one line separated by ';'
+        """
+        msgs = [':READ:FREQ?', ':FETC:POW?', ':FETC:SMSR?']
+
+        if pipelined:
+            replies = self._interface.query(';'.join(msgs)).split(';')
+            if len(replies) != len(msgs):
+                raise ValueError(f'Unexpected snapshot reply: {replies}')
+        else:
+            replies = [self._interface.query(msg) for msg in msgs]
+        freq_raw, pow_raw, smsr_raw = (reply.strip() for reply in replies)
+        mode = self._cfg_cache.get('smsr_mode')
+        if mode is None and smsr_raw != 'SMSR off':
+            mode = self.get_smsr_mode()
+
+        return WlmSnapshot(freq=float(freq_raw), power=float(pow_raw),
+                           smsr=self._parse_smsr(smsr_raw, mode))
+
     def get_smsr_excl(self) -> float:
         """ Queries the exclusion region around the main peak
 
@@ -405,7 +517,7 @@ class BristolWM(AbsWM):
         """
         msg = ':CALCulate2:SMSR:EXCLusion?'
 
-        return float(self._interface.query(msg))
+        return self._cached_query('smsr_excl', msg, float)
 
     def set_smsr_excl(self, excl: float) -> bool:
         """ Sets the exclusion region around the main peak
@@ -421,7 +533,9 @@ class BristolWM(AbsWM):
                            f'coerced to {self.smsr_excl_max}')
             excl = self.smsr_excl_max
         msg = f':CALCulate2:SMSR:EXCLusion {excl}'
-        return self._interface.write(msg)
+        ret = self._write(msg)
+        self._cfg_cache['smsr_excl'] = float(excl)
+        return ret
 
     def get_smsr_rng(self) -> float:
         """ Gets the range over which the SMSR cal. identifies a side-mode
@@ -430,7 +544,7 @@ class BristolWM(AbsWM):
         """
         msg = ':CALCulate2:SMSR:RANGe?'
 
-        return float(self._interface.query(msg))
+        return self._cached_query('smsr_rng', msg, float)
 
     def set_smsr_rng(self, rng: float) -> bool:
         """ Sets the range over which the SMSR cal. identifies a side-mode
@@ -447,7 +561,9 @@ class BristolWM(AbsWM):
             rng = self.smsr_rng_max
 
         msg = f':CALCulate2:SMSR:RANGe {rng}'
-        return self._interface.write(msg)
+        ret = self._write(msg)
+        self._cfg_cache['smsr_rng'] = float(rng)
+        return ret
 
     def get_smsr_stat(self) -> str:
         """ Gets whether the SMSR calculation is performed
@@ -457,7 +573,7 @@ class BristolWM(AbsWM):
         """
         msg = ':CALCulate2:SMSR:STATe?'
 
-        return self._interface.query(msg)
+        return self._cached_query('smsr_stat', msg)
 
     def set_smsr_stat(self, stat: str) -> bool:
         """ Sets whether the SMSR calculation is performed """
@@ -466,7 +582,8 @@ class BristolWM(AbsWM):
 
         if stat in valid_val:
             msg = f':CALCulate2:SMSR:STATe {stat}'
-            self._interface.write(msg)
+            self._write(msg)
+            self._cfg_cache['smsr_stat'] = stat
             return True
         else:
             logger.warning(f'Not a valid state to set: {stat}')
@@ -488,6 +605,7 @@ class BristolWM(AbsWM):
                            f'{valid_methods}')
             return False
         self._interface.write(f':CALCulate2:SCALar {scal_method}')
+        self._cfg_cache['scalar_method'] = scal_method
         return True
 
     def get_scalar_method(self) -> str:
@@ -496,38 +614,20 @@ class BristolWM(AbsWM):
         Returns: One of 'PEAK', 'REF', 'FPAV', 'BBAN'
 
         """
-        return self._interface.query(':CALCulate2:SCALar?')
+        return self._cached_query('scalar_method', ':CALCulate2:SCALar?')
 
     def get_spectrum(self) -> dict:
         res_dict = {'Wavelength(nm)': [], 'Power(dBm)': []}
-        if self._int_type != 'telnet':
+        if not hasattr(self._interface, 'read_binary_block'):
             res_dict['Frequency(THz)'] = []
-            logging.warning('get_spectrum ')
+            logging.warning(f'get_spectrum not supported on {self._interface}')
             return res_dict
-        sample_size = 12 #bytes
-        self._interface.tn.write(b':CALC3:DATA?\r\n')
-        #Getting first character
-        self._interface.tn.rawq_getchar()
-        #Number of characters in the byte string
-        num_bytes_char = int(self._interface.tn.rawq_getchar())
-        #Finding total number of bytes
-        tot_bytes = 0
-        for indx in range(num_bytes_char):
-            char = self._interface.tn.rawq_getchar()
-            tot_bytes += int(char)*10**(num_bytes_char-indx-1)
-
-        #Computing number of samples
-        num_samples = int(tot_bytes/sample_size)
-
-        for _ in range(num_samples):
-            raw_data = b''
-            for _ in range(sample_size):
-                raw_data += self._interface.tn.rawq_getchar()
-            wvl, pwr = unpack('<df', raw_data)
-            res_dict['Wavelength(nm)'].append(wvl)
-            res_dict['Power(dBm)'].append(pwr)
-        res_dict['Wavelength(nm)'] = np.asarray(res_dict['Wavelength(nm)'])
-        res_dict['Power(dBm)'] = np.asarray(res_dict['Power(dBm)'])
+        self._interface.write(':CALC3:DATA?')
+        block = self._interface.read_binary_block()
+        # IEEE-488.2 block of 12 bytes samples, decoded in one pass
+        samples = np.frombuffer(block, dtype=SPECTRUM_DTYPE, count=len(block) // SPECTRUM_DTYPE.itemsize)
+        res_dict['Wavelength(nm)'] = samples['wavelength'].astype(np.float64)
+        res_dict['Power(dBm)'] = samples['power'].astype(np.float64)
         res_dict['Frequency(THz)'] = (299792458 / res_dict['Wavelength(nm)']) * 1e-3
 
         return res_dict
\ No newline at end of file
@@ -1,4 +1,5 @@
 import logging
+import select
 import socket
 import time
 
@@ -8,14 +9,15 @@ from src.common_functions import narrowAllowedRange
 class Clime_Temp_Event:
     """A class represents Weiss Technik temperature chamber"""
 
-    def __init__(self, address: str, query_delay: float = 0.05):
+    def __init__(self, address: str):
         self.ip = address
         self.port = 2049
-        self.query_delay = float(query_delay)
         self.buff_size = 2 ** 10
         self.delimiter = b'\xb6'
         self.cr = b'\r'
+        self.eom = b'\r\n'  # end of a reply
         self.sock = None
+        self._rx = bytearray()  # received bytes not consumed yet
 
         self.target_temperature = None
         self.measured_temperature = None
@@ -34,17 +36,35 @@ class Clime_Temp_Event:
         cmd = cmd + self.cr
         return cmd
 
+    def _send(self, msg):
+        """ Sends a command after discarding any reply still pending, so the next read() is its reply """
+        self._rx.clear()
+        while select.select([self.sock], [], [], 0)[0]:
+            if not self.sock.recv(self.buff_size):
+                raise ConnectionError('Connection closed by the temperature chamber')
+        self.sock.sendall(msg)
+
     def write(self, msg):
-        self.sock.send(msg)
+        """ Sends a setting command and reads its acknowledgement, so it is not taken as a later reply """
+        self._send(msg)
+        return self.read()
 
     def read(self):
-        read_data = self.sock.recv(self.buff_size)
+        """ Returns one reply, up to and including self.eom """
+        idx = self._rx.find(self.eom)
+        while idx < 0:
+            chunk = self.sock.recv(self.buff_size)  # socket timeout raises if the reply is incomplete
+            if not chunk:
+                raise ConnectionError('Connection closed by the temperature chamber')
+            self._rx += chunk
+            idx = self._rx.find(self.eom, max(0, len(self._rx) - len(chunk) - len(self.eom) + 1))
+        read_data = bytes(self._rx[:idx + len(self.eom)])
+        del self._rx[:idx + len(self.eom)]
         # self.showSimServData(read_data)
         return read_data
 
     def query(self, msg):
-        self.write(msg)
-        time.sleep(self.query_delay)
+        self._send(msg)
         return self.read()
 
     def connect(self):
@@ -52,6 +72,7 @@ class Clime_Temp_Event:
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.sock.settimeout(2)
         self.sock.connect((self.ip, self.port))
+        self._rx.clear()
 
     def close(self):
         self.sock.close()
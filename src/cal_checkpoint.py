@@ -0,0 +1,91 @@
+import json
+import logging
+import os
+from pathlib import Path
+
+
+class CalJournal:
+    """
+    Append-only checkpoint journal of one path loss calibration run.
+
+    Every record is one JSON line, flushed to disk as soon as it is written:
+        {"type": "run", ...}    run header (station, operator, datetime)
+        {"type": "crp", ...}    calibration reference power
+        {"type": "bay", ...}    raw OPM/WLM readings of a bay which passed its limits
+    A partially written last line (e.g. power loss) is ignored on load.
+    """
+
+    def __init__(self, filename):
+        if type(filename) is not Path:
+            filename = Path(filename)
+        self.filename = filename
+        self.header = None
+        self.crp = None
+        self.bays = {}
+
+    def exists(self) -> bool:
+        return self.filename.is_file()
+
+    def start(self, header: dict):
+        """ Start a new journal, discarding any previous run """
+        self.header = dict(header)
+        self.crp = None
+        self.bays = {}
+        self.filename.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.filename.as_posix(), 'w') as fp:
+            self._write(fp, {'type': 'run', **self.header})
+
+    def record_crp(self, crp: float):
+        self.crp = crp
+        self._append({'type': 'crp', 'CRP(dB)': crp})
+
+    def record_bay(self, bay: int, reading: dict):
+        self.bays[int(bay)] = dict(reading)
+        self._append({'type': 'bay', 'bay': int(bay), **reading})
+
+    def is_measured(self, bay: int) -> bool:
+        return int(bay) in self.bays
+
+    def load(self) -> bool:
+        """
+        Load the journal from disk
+        :return: True if a run header was found
+        """
+        self.header = None
+        self.crp = None
+        self.bays = {}
+        if not self.exists():
+            return False
+        with open(self.filename.as_posix(), 'r') as fp:
+            for line in fp:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logging.warning(f"Ignore incomplete checkpoint record: {line.strip()}")
+                    continue
+                record_type = record.pop('type', None)
+                if record_type == 'run':
+                    self.header = record
+                elif record_type == 'crp':
+                    self.crp = record['CRP(dB)']
+                elif record_type == 'bay':
+                    self.bays[int(record.pop('bay'))] = record
+        return self.header is not None
+
+    def clear(self):
+        """ Remove the journal once the run is stored """
+        self.header = None
+        self.crp = None
+        self.bays = {}
+        if self.exists():
+            self.filename.unlink()
+
+    def _append(self, record: dict):
+        with open(self.filename.as_posix(), 'a') as fp:
+            self._write(fp, record)
+
+    @staticmethod
+    def _write(fp, record: dict):
+        fp.write(json.dumps(record) + '\n')
+        fp.flush()
+        os.fsync(fp.fileno())
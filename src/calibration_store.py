@@ -0,0 +1,243 @@
+import logging
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.common_functions import to_fwf
+
+ITERATION = 'Iteration(#)'
+STATION = 'Station_ID(#)'
+
+
+def _quote(col: str) -> str:
+    return '"' + col.replace('"', '""') + '"'
+
+
+def _affinity(col: str) -> str:
+    """ SQLite column type: REAL for the measured values, INTEGER for the flags, TEXT otherwise """
+    if col.endswith('(bool)'):
+        return 'INTEGER'
+    if col.endswith(('(dB)', '(THz)')) or 'SMSR' in col:
+        return 'REAL'
+    return 'TEXT'
+
+
+def _to_sql_value(value):
+    if value is None:
+        return 0
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (int, float, str, bytes)):
+        return value
+    return str(value)
+
+
+class CalibrationStore:
+    """
+    Append-only SQLite store of the path loss calibration history.
+
+    One row per calibration iteration with the columns of patch_character(). The iteration number
+    is the SQLite row id, so storing a new iteration is a single INSERT whatever the size of the
+    history. The legacy fixed-width file is imported once into an empty store and can be
+    re-created on demand with export_fwf().
+    """
+    TABLE = 'calibration'
+
+    def __init__(self, db_file, columns: list, legacy_file=None):
+        if type(db_file) is not Path:
+            db_file = Path(db_file)
+        if legacy_file is not None and type(legacy_file) is not Path:
+            legacy_file = Path(legacy_file)
+        self.db_file = db_file
+        self.columns = list(columns)
+        self.legacy_file = legacy_file
+        self._lock = threading.Lock()
+        self._initialised = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_file.as_posix(), timeout=10)
+        if not self._initialised:
+            with self._lock:
+                if not self._initialised:
+                    self._create_table(conn)
+                    self._initialised = True
+        return conn
+
+    def _create_table(self, conn: sqlite3.Connection):
+        data_cols = [col for col in self.columns if col != ITERATION]
+        with conn:
+            conn.execute(f'CREATE TABLE IF NOT EXISTS {self.TABLE} ({_quote(ITERATION)} INTEGER PRIMARY KEY, '
+                         + ', '.join(f'{_quote(col)} {_affinity(col)}' for col in data_cols) + ')')
+            existing = [row[1] for row in conn.execute(f'PRAGMA table_info({self.TABLE})')]
+            for col in data_cols:
+                if col not in existing:
+                    conn.execute(f'ALTER TABLE {self.TABLE} ADD COLUMN {_quote(col)} {_affinity(col)} DEFAULT 0')
+        empty = conn.execute(f'SELECT COUNT(*) FROM {self.TABLE}').fetchone()[0] == 0
+        if empty and self.legacy_file is not None and self.legacy_file.is_file():
+            self._import_fwf(conn, self.legacy_file)
+
+    def _import_fwf(self, conn: sqlite3.Connection, filename: Path):
+        try:
+            df = pd.read_fwf(filename)
+        except Exception as e:
+            logging.error(f"Cannot import legacy calibration file {filename}: {e}")
+            return
+        df.fillna(0, inplace=True)
+        cols = [col for col in self.columns if col in df.columns]
+        rows = [[_to_sql_value(val) for val in row] for row in df[cols].itertuples(index=False)]
+        with conn:
+            conn.executemany(f'INSERT INTO {self.TABLE} ({", ".join(_quote(col) for col in cols)}) '
+                             f'VALUES ({", ".join("?" * len(cols))})', rows)
+        logging.info(f"Imported {len(rows)} iterations from legacy calibration file {filename}")
+
+    def append(self, row: dict) -> int:
+        """
+        Store one calibration iteration
+        :param row: Dictionary with the column values, missing columns are stored as 0
+        :return: Iteration number of the stored row
+        """
+        cols = [col for col in self.columns if col != ITERATION]
+        values = [_to_sql_value(row.get(col)) for col in cols]
+        conn = self._connect()
+        try:
+            with conn:
+                cursor = conn.execute(f'INSERT INTO {self.TABLE} ({", ".join(_quote(col) for col in cols)}) '
+                                      f'VALUES ({", ".join("?" * len(cols))})', values)
+            return cursor.lastrowid
+        finally:
+            conn.close()
+
+    def last_iteration(self) -> int:
+        conn = self._connect()
+        try:
+            last = conn.execute(f'SELECT MAX({_quote(ITERATION)}) FROM {self.TABLE}').fetchone()[0]
+        finally:
+            conn.close()
+        return 0 if last is None else last
+
+    def read_frame(self, since_iteration: int = None) -> pd.DataFrame:
+        """
+        Read the calibration history
+        :param since_iteration: Only return iterations after this one
+        :return: DataFrame with the columns of the store, ordered by iteration, the measured values as float
+            and the flags as bool
+        """
+        query = f'SELECT * FROM {self.TABLE}'
+        params = ()
+        if since_iteration is not None:
+            query += f' WHERE {_quote(ITERATION)} > ?'
+            params = (int(since_iteration),)
+        query += f' ORDER BY {_quote(ITERATION)}'
+        conn = self._connect()
+        try:
+            df = pd.read_sql_query(query, conn, params=params)
+        finally:
+            conn.close()
+        # stores created before the column types hold the values as stored, e.g. "0" strings
+        for col in df.columns:
+            if _affinity(col) == 'REAL':
+                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0.0)
+            elif _affinity(col) == 'INTEGER':
+                df[col] = df[col].map(lambda value: str(value).strip().lower() in ('1', '1.0', 'true'))
+        return df
+
+    def export_fwf(self, filename):
+        """ Write the whole history to the legacy fixed-width text file, flags as False/True """
+        df = self.read_frame()
+        to_fwf(df[[col for col in self.columns if col in df.columns]], filename)
+        logging.info(f"Export calibration history to {filename}")
+
+
+class LatestOffsets:
+    """
+    Cached table of the latest WLM/OPM calibration offsets keyed by station and bay.
+
+    The table is built from the store with one read-only scan and rebuilt only when the store
+    file changes (modification time or size), so a lookup is a stat() and a dictionary access.
+    A bay keeps the value of the last iteration in which it was measured (non-zero).
+    """
+
+    def __init__(self, db_file):
+        if type(db_file) is not Path:
+            db_file = Path(db_file)
+        self.db_file = db_file
+        self._version = None
+        self._table = {}
+        self._lock = threading.Lock()
+
+    def _file_version(self):
+        try:
+            stat = os.stat(self.db_file)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self) -> dict:
+        table = {}
+        conn = sqlite3.connect(f'{self.db_file.as_uri()}?mode=ro', uri=True, timeout=10)
+        try:
+            existing = [row[1] for row in conn.execute(f'PRAGMA table_info({CalibrationStore.TABLE})')]
+            bay_cols = []
+            for bay in range(1, 71):
+                wlm_col = f'WLM_Bay{bay:02d}(dB)'
+                opm_col = f'OPM_Bay{bay:02d}(dB)'
+                if wlm_col in existing and opm_col in existing:
+                    bay_cols.append((bay, wlm_col, opm_col))
+            if STATION not in existing or not bay_cols:
+                return table
+            cols = [STATION] + [col for _, wlm_col, opm_col in bay_cols for col in (wlm_col, opm_col)]
+            rows = conn.execute(f'SELECT {", ".join(_quote(col) for col in cols)} FROM {CalibrationStore.TABLE} '
+                                f'ORDER BY {_quote(ITERATION)}')
+            for row in rows:
+                station = row[0]
+                for i, (bay, _, _) in enumerate(bay_cols):
+                    wlm_offset = float(row[1 + 2 * i] or 0)
+                    opm_offset = float(row[2 + 2 * i] or 0)
+                    if wlm_offset or opm_offset:
+                        table[(station, bay)] = (wlm_offset, opm_offset)
+        finally:
+            conn.close()
+        return table
+
+    def refresh(self):
+        """ Rebuild the table if the store file changed since the last load """
+        version = self._file_version()
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            self._table = {} if version is None else self._load()
+            self._version = version
+            logging.debug(f"Loaded calibration offsets of {len(self._table)} bays from {self.db_file}")
+
+    def get(self, station: str, bay: int) -> tuple:
+        """
+        :param station: Station ID
+        :param bay: TOSA bay number
+        :return: (wlm_offset, opm_offset) in dB, (0, 0) if the bay was never calibrated
+        """
+        self.refresh()
+        return self._table.get((station, int(bay)), (0.0, 0.0))
+
+
+_latest_offsets = {}
+
+
+def get_latest_offsets(db_file) -> LatestOffsets:
+    """ Process-wide LatestOffsets cache of a store file """
+    key = Path(db_file).as_posix()
+    if key not in _latest_offsets:
+        _latest_offsets[key] = LatestOffsets(db_file)
+    return _latest_offsets[key]
+
+
+if __name__ == '__main__':
+    from src.initialise_station_configs import Pl_FILE
+    from src.path_lost_sequence import export_data
+
+    export_data(Pl_FILE)
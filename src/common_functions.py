@@ -4,8 +4,6 @@ from pathlib import Path
 import yaml
 from typing import Dict
 import pandas as pd
-import matplotlib.pyplot as plt
-import numpy as np
 
 
 def set_console_position(x, y):
@@ -58,26 +56,6 @@ def write_date(file):
     df_in['DateTime(#)'] = pd.to_datetime(df_in['DateTime(#)'])
 
 
-def plot_control_chart(bay, pl_file, file_c):
-    df = pd.read_fwf(pl_file)
-    df.fillna(0, inplace=True)
-    df['Datetime(#)'] = pd.to_datetime(df['Datetime(#)'], format='%Y-%m-%d_%H-%M-%S')
-    fig = plt.figure(figsize=(10, 10))
-    for bay_num in bay:
-        rgb = (np.random.random(), np.random.random(), np.random.random())
-        plt.plot(df['Datetime(#)'], df[f'OPM_Bay{bay_num:02d}(dB)'], label=f'OPM_Bay{bay_num:02d}(dB)',
-                 marker='o', linestyle='-', c=rgb)
-    plt.style.use('ggplot')
-    plt.grid(True)
-    plt.legend(loc=(1.01, 0.7), fancybox=1)
-    plt.title("Optical Power Meter by Date", pad=10)
-    plt.xticks(rotation=45)
-    plt.xlim(df['Datetime(#)'][0] - np.timedelta64(3, 'D'), df['Datetime(#)'].iloc[-1] + np.timedelta64(3, 'D'))
-    plt.xlabel("Datetime(#)")
-    plt.ylabel("Optical Power Meter (dB)")
-    fig.savefig(f"{file_c}", dpi=fig.dpi, bbox_inches='tight')
-
-
 def verify_limit(value, high, low, limit_name: str):
     if low <= value <= high:
         print(f"Pass Verify limit {limit_name}: {low} <= {value} <= {high}")
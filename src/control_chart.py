@@ -0,0 +1,142 @@
+import logging
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib import colormaps
+
+from src.calibration_store import CalibrationStore, ITERATION
+
+DATETIME = 'Datetime(#)'
+DATETIME_FORMAT = '%Y-%m-%d_%H-%M-%S'
+BAYS = 70
+
+
+class ControlChart:
+    """
+    Incremental OPM control chart of the calibration history.
+
+    The per-bay OPM series are kept pre-aggregated as one time vector and one (iterations x bays)
+    matrix, persisted in a .npz sidecar next to the store. An update only reads and parses the
+    iterations stored since the last update, and long histories are downsampled to bucket means
+    before drawing, so the rendering time does not grow with the history. Rendering uses the Agg
+    canvas directly (no pyplot state) so it is safe from the sequence worker threads.
+    """
+
+    def __init__(self, store: CalibrationStore, cache_file, max_points: int = 500):
+        if type(cache_file) is not Path:
+            cache_file = Path(cache_file)
+        self.store = store
+        self.cache_file = cache_file
+        self.max_points = max_points
+        self.iterations = np.empty(0, dtype=np.int64)
+        self.times = np.empty(0, dtype='datetime64[s]')
+        self.values = np.empty((0, BAYS), dtype=np.float64)
+        self._lock = threading.Lock()
+        self._load_cache()
+
+    def _load_cache(self):
+        if not self.cache_file.is_file():
+            return
+        try:
+            with np.load(self.cache_file.as_posix()) as cache:
+                iterations, times, values = cache['iterations'], cache['times'], cache['values']
+        except Exception as e:
+            logging.warning(f"Ignore control chart cache {self.cache_file}: {e}")
+            return
+        if values.shape[1:] != (BAYS,) or len(iterations) != len(values) or len(times) != len(values):
+            logging.warning(f"Ignore control chart cache {self.cache_file}: unexpected shape")
+            return
+        self.iterations, self.times, self.values = iterations, times, values
+
+    def _save_cache(self):
+        tmp_file = self.cache_file.with_suffix('.tmp.npz')
+        np.savez(tmp_file.as_posix(), iterations=self.iterations, times=self.times, values=self.values)
+        tmp_file.replace(self.cache_file)
+
+    @property
+    def last_iteration(self) -> int:
+        return int(self.iterations[-1]) if len(self.iterations) else 0
+
+    def update(self) -> int:
+        """
+        Append the iterations stored since the last update
+        :return: Number of appended iterations
+        """
+        with self._lock:
+            if self.store.last_iteration() < self.last_iteration:
+                logging.warning("Calibration store was rebuilt, reload the control chart series")
+                self.iterations = self.iterations[:0]
+                self.times = self.times[:0]
+                self.values = self.values[:0]
+            df = self.store.read_frame(since_iteration=self.last_iteration or None)
+            if df.empty:
+                return 0
+            times = pd.to_datetime(df[DATETIME], format=DATETIME_FORMAT, errors='coerce').to_numpy('datetime64[s]')
+            values = np.zeros((len(df), BAYS), dtype=np.float64)
+            for bay in range(1, BAYS + 1):
+                col = f'OPM_Bay{bay:02d}(dB)'
+                if col in df.columns:
+                    values[:, bay - 1] = pd.to_numeric(df[col], errors='coerce').fillna(0).to_numpy()
+            self.iterations = np.concatenate([self.iterations, df[ITERATION].to_numpy(np.int64)])
+            self.times = np.concatenate([self.times, times])
+            self.values = np.concatenate([self.values, values])
+            self._save_cache()
+            return len(df)
+
+    def series(self, bay: int) -> tuple:
+        """
+        Measured points of a bay, downsampled to at most max_points bucket means
+        :param bay: TOSA bay number
+        :return: (times, values)
+        """
+        values = self.values[:, bay - 1]
+        mask = (values != 0) & ~np.isnat(self.times)
+        times = self.times[mask].astype(np.int64)
+        values = values[mask]
+        if len(values) > self.max_points:
+            starts = np.linspace(0, len(values), self.max_points, endpoint=False).astype(np.int64)
+            counts = np.diff(np.append(starts, len(values)))
+            values = np.add.reduceat(values, starts) / counts
+            times = np.add.reduceat(times, starts) // counts
+        return times.astype('datetime64[s]'), values
+
+    def render(self, bay, file_c, flags=None):
+        """
+        Draw the OPM series of the bays and save the chart
+        :param bay: List of bay numbers
+        :param file_c: Output image file
+        :param flags: Optional {bay: [SPC rule names]}, the last point of these bays is highlighted
+        :return:
+        """
+        flags = flags or {}
+        fig = Figure(figsize=(10, 10))
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        cmap = colormaps['turbo']
+        t_min, t_max = None, None
+        for bay_num in bay:
+            times, values = self.series(bay_num)
+            if not len(values):
+                continue
+            label = f'OPM_Bay{bay_num:02d}(dB)'
+            if bay_num in flags:
+                label += f" SPC: {', '.join(flags[bay_num])}"
+                ax.plot(times[-1:], values[-1:], marker='o', markersize=14, markerfacecolor='none',
+                        markeredgecolor='red', markeredgewidth=2, linestyle='none')
+            ax.plot(times, values, label=label, marker='o', linestyle='-', c=cmap((bay_num - 1) / (BAYS - 1)))
+            t_min = times[0] if t_min is None else min(t_min, times[0])
+            t_max = times[-1] if t_max is None else max(t_max, times[-1])
+        ax.grid(True)
+        ax.legend(loc=(1.01, 0.7), fancybox=1)
+        ax.set_title("Optical Power Meter by Date", pad=10)
+        ax.tick_params(axis='x', labelrotation=45)
+        if t_min is not None:
+            ax.set_xlim(t_min - np.timedelta64(3, 'D'), t_max + np.timedelta64(3, 'D'))
+        ax.set_xlabel("Datetime(#)")
+        ax.set_ylabel("Optical Power Meter (dB)")
+        fig.savefig(f"{file_c}", dpi=fig.dpi, bbox_inches='tight')
+        logging.info(f"Save control chart: {file_c}")
@@ -4,6 +4,9 @@ from pathlib import Path
 LOCK_C_FOLDER = Path(r'C:\LockFolder')
 Pl_FOLDER = Path(r'C:\PathLossCalFiles')
 Pl_FILE = Pl_FOLDER.joinpath('optical_calibration_values.txt')
+Pl_DB = Pl_FOLDER.joinpath('optical_calibration_values.sqlite')
+Pl_CHECKPOINT = Pl_FOLDER.joinpath('calibration_checkpoint.jsonl')
+Pl_CHART_CACHE = Pl_FOLDER.joinpath('control_chart_cache.npz')
 LOG_Pl_FOLDER = Path(r'C:\LOG_OpticalPathLoss')
 
 LOCK_C_LOGFILE = LOCK_C_FOLDER.joinpath('lock_lock.txt')
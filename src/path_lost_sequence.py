@@ -1,5 +1,6 @@
 import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from tabulate import tabulate
 import pandas as pd
 from pathlib import Path
@@ -9,8 +10,12 @@ from gui_externals.instruments_api.optical.opm.keysight_opm import Pwm
 from gui_externals.instruments_api.optical.switch.santec_switch import Switch
 from gui_externals.instruments_api.optical.wave_meter.bristol_wm import BristolWM
 
-from src.initialise_station_configs import INSTR_YAML_CONFIG, LIMIT_PathLoss
-from src.common_functions import load_yaml_file, UserDict, plot_control_chart, verify_limit
+from src.initialise_station_configs import INSTR_YAML_CONFIG, LIMIT_PathLoss, Pl_CHECKPOINT, Pl_DB, Pl_CHART_CACHE
+from src.common_functions import load_yaml_file, UserDict, verify_limit
+from src.cal_checkpoint import CalJournal
+from src.calibration_store import CalibrationStore
+from src.control_chart import ControlChart
+from src.spc import analyze, log_flags
 
 user_dict = UserDict.keys_user
 WLM_FREQ = "WLM_freq(THz)"
@@ -43,24 +48,23 @@ class OpticalInstruments:
             self.load_settings_file()
 
         eq_start_time = time.time()
-        # TODO: Need to make the bristol WLM use READ not MEAS to increase speed
+        # Bay readings use get_snapshot(): one READ scan, power and SMSR fetched from the same scan
         self.wlm = BristolWM(interface=TelnetInterface(ip=self._instr_cfg['wlm']['addr']),
                              skip_msg=self._instr_cfg['wlm']['skip_msg'])
         # self.wlm = BristolWM(interface=SocketInterface(ip=self._instr_cfg['wlm']['addr'],
         #                                                port=self._instr_cfg['wlm']['port']))
         if self._instr_cfg['wlm']['controller'] == 'SocketInterface':
-            self.wlm._interface.read()  # Use only for socket interface
+            self.wlm._interface.read_banner()  # Use only for socket interface
 
-        # TODO: Cleanup and reorder set configs, etc. Maybe separate function?
         if self._set_configs_flag:
-            self.wlm.set_cfg(**self._instr_cfg['wlm']['config'])
-            self.wlm.set_smsr_mode('1')
+            # one batched configuration message, SMSR mode 1 is required by the SMSR readings
+            self.wlm.set_cfg(**{**self._instr_cfg['wlm']['config'], 'smsr_mode': '1'})
         logging.debug(f'Bristol WLM, {self.wlm.get_idn()}, connection time: {time.time() - eq_start_time:.2f}s')
         eq_start_time = time.time()
         self.opm = Pwm(interface=VISAInterface(address=self._instr_cfg['opm']['addr']),
                        channel=self._instr_cfg['opm']['config']['channel'])
         if self._set_configs_flag:
-            temp_config = self._instr_cfg['opm']['config']
+            temp_config = dict(self._instr_cfg['opm']['config'])
             temp_config.pop('channel')
             self.opm.set_config(temp_config)
         logging.debug(f'Keysight OPM, {self.opm.idn},  connection time: {time.time() - eq_start_time:.2}s')
@@ -79,6 +83,46 @@ class OpticalInstruments:
         # if self.osw.get_channel() != channel:
         #    raise Exception(f"Cannot Set OSX to {channel}")
 
+    def wait_osx_settled(self, channel: int) -> float:
+        """
+        Wait until the OSX is on the requested channel and, if configured, the OPM power is stable
+        :param channel: Expected switch channel
+        :return: Settle time in seconds
+        """
+        settle_cfg = self._instr_cfg['osw'].get('settle') or {}
+        power_reader = None
+        if settle_cfg.get('power_stable_count'):
+            power_reader = self.opm_get_pwr
+        return self.osw.wait_settled(channel=channel,
+                                     timeout=settle_cfg.get('timeout', 5),
+                                     power_reader=power_reader,
+                                     stable_count=settle_cfg.get('power_stable_count', 3),
+                                     tolerance=settle_cfg.get('power_tolerance', 0.05))
+
+    def acquire_bay(self) -> dict:
+        """
+        Read the WLM and the OPM concurrently on the current OSX channel.
+        The WLM frequency, power and SMSR come from a single scan (BristolWM.get_snapshot).
+        :return: Dictionary with keys 'WLM_freq', 'WLM_SMSR' and 'OPM_pwr'
+        """
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            wlm_future = pool.submit(self._wlm_read)
+            opm_future = pool.submit(self.opm_get_pwr)
+            out_dict = wlm_future.result()
+            out_dict['OPM_pwr'] = opm_future.result()
+        return out_dict
+
+    def _wlm_read(self) -> dict:
+        out_dict = {'WLM_freq': None, 'WLM_SMSR': None}
+        try:
+            snapshot = self.wlm.get_snapshot()
+            out_dict['WLM_freq'] = snapshot.freq
+            out_dict['WLM_SMSR'] = snapshot.smsr
+        except ValueError as e:
+            logging.error(e)
+            out_dict['WLM_SMSR'] = self.wlm_get_smsr()
+        return out_dict
+
     # wlm
     def wlm_get_freq(self):
         """
@@ -125,6 +169,70 @@ class OpticalInstruments:
 #     case = src.patlost_debug.OpticalInstruments()
 # else:
 case = OpticalInstruments()
+journal = CalJournal(Pl_CHECKPOINT)
+
+
+def checkpoint_available() -> bool:
+    return journal.exists()
+
+
+def reset_run_state():
+    """
+    Clear the results of the previous run of the session
+    :return:
+    """
+    user_dict['fail'] = False
+    user_dict['Iteration(#)'] = None
+    user_dict['Datetime(#)'] = time.strftime('%Y-%m-%d_%H-%M-%S')
+    user_dict[CRP] = None
+    user_dict[WLM_FREQ] = None
+    user_dict[WLM_SMSR] = None
+    user_dict.pop('CRP(dB)_end', None)
+    user_dict.pop('spc', None)
+    user_dict.pop('osw_settle', None)
+    for bay in range(1, 71):
+        user_dict[f'WLM_Bay{bay:02d}(dB)'] = "0"
+        user_dict[f'OPM_Bay{bay:02d}(dB)'] = "0"
+        for key in (f'WLM_Bay_RAW{bay:02d}(dB)', f'OPM_Bay_RAW{bay:02d}(dB)', f'TPL_Bay{bay:02d}(dB)',
+                    f'WLM_freq_Bay{bay:02d}(THz)', f'WLM_SMSR_Bay{bay:02d}'):
+            user_dict.pop(key, None)
+
+
+def start_run(resume: bool = False):
+    """
+    Start the checkpoint journal of a new run or restore the measured bays of the previous one
+    :param resume: Reuse CRP and bay readings of the previous, unfinished run
+    :return:
+    """
+    reset_run_state()
+    user_dict['resume'] = False
+    if resume and journal.load():
+        user_dict['resume'] = True
+        user_dict['Datetime(#)'] = journal.header.get('Datetime(#)', user_dict['Datetime(#)'])
+        if journal.crp is not None:
+            user_dict[CRP] = journal.crp
+        # journal order is the measurement order: the run values come from the last measured bay
+        for bay, reading in journal.bays.items():
+            user_dict[f'WLM_Bay_RAW{bay:02d}(dB)'] = reading['WLM_Bay_RAW']
+            user_dict[f'OPM_Bay_RAW{bay:02d}(dB)'] = reading['OPM_Bay_RAW']
+            user_dict[f'WLM_freq_Bay{bay:02d}(THz)'] = reading.get(WLM_FREQ)
+            user_dict[f'WLM_SMSR_Bay{bay:02d}'] = reading.get(WLM_SMSR)
+            user_dict[WLM_FREQ] = reading.get(WLM_FREQ)
+            user_dict[WLM_SMSR] = reading.get(WLM_SMSR)
+        logging.info(f"Resume calibration of {journal.header['Datetime(#)']}: CRP {journal.crp}, "
+                     f"measured bays {sorted(journal.bays)}")
+        return
+    journal.start({'Station_ID(#)': user_dict['Station_ID(#)'],
+                   'Operator_ID(#)': user_dict['Operator_ID(#)'],
+                   'Datetime(#)': user_dict['Datetime(#)']})
+
+
+def crp_checkpointed() -> bool:
+    return bool(user_dict.get('resume')) and journal.crp is not None
+
+
+def bay_checkpointed(bay: int) -> bool:
+    return bool(user_dict.get('resume')) and journal.is_measured(bay)
 
 
 def setup_instrument_config():
@@ -143,8 +251,8 @@ def wait_time(wait):
 
 
 def osx_set_channel(channel):
-    time.sleep(1)
     case.set_osx_to_bay(channel=channel)
+    case.wait_osx_settled(channel=channel)
     # print(f"Set Channel Optical Switch on channel: {channel}")
     logging.info(f"Set Channel Optical Switch on channel: {channel}")
 
@@ -171,6 +279,34 @@ def read_wlm_on_port(bay):
     # print(f"Wavelength Power: {wlm_pwr}")
 
 
+def read_bay_on_port(bay: int):
+    """
+    Set the OSX to the bay, wait for it to settle and read WLM and OPM together
+    :param bay: TOSA bay number
+    :return:
+    """
+    if bay_checkpointed(bay):
+        logging.info(f"Bay {bay:02d} readings restored from checkpoint")
+        return
+    case.set_osx_to_bay(channel=bay)
+    settle_time = case.wait_osx_settled(channel=bay)
+    logging.info(f"Set Channel Optical Switch on channel: {bay}, settled in {settle_time:.3f}s")
+    reading = case.acquire_bay()
+    logging.info(f"Wavelength Frequency: {reading['WLM_freq']}")
+    logging.info(f"Wavelength SMSR: {reading['WLM_SMSR']}")
+    logging.info(f"Reading OPM {bay:02d}: {reading['OPM_pwr']}")
+
+    if reading['WLM_freq'] is not None:
+        user_dict['WLM_freq(THz)'] = reading['WLM_freq']
+    user_dict['WLM_SMSR'] = reading['WLM_SMSR']['SMSR']
+    # per bay copies, the run values above are overwritten by the next bay before this one is recorded
+    user_dict[f'WLM_freq_Bay{bay:02d}(THz)'] = reading['WLM_freq']
+    user_dict[f'WLM_SMSR_Bay{bay:02d}'] = reading['WLM_SMSR']['SMSR']
+    # The WLM port power has always been taken from the OPM, one reading now serves both
+    user_dict[f'WLM_Bay_RAW{bay:02d}(dB)'] = reading['OPM_pwr']
+    user_dict[f'OPM_Bay_RAW{bay:02d}(dB)'] = reading['OPM_pwr']
+
+
 def read_opm_on_port(bay: int):
     time.sleep(1)
     opm_port = case.opm_get_pwr()
@@ -185,13 +321,20 @@ def crp_get_data():
     CRP
     :return:
     """
-    crp_power = case.opm_get_pwr()
+    checkpointed = crp_checkpointed()
+    if checkpointed:
+        crp_power = journal.crp
+        logging.info(f"CRP power from checkpoint: {crp_power}")
+    else:
+        crp_power = case.opm_get_pwr()
+        logging.info(f"CRP power: {crp_power}")
     user_dict['CRP(dB)'] = crp_power
-    logging.info(f"CRP power: {crp_power}")
     verify_limit(crp_power,
                  user_dict['limit']['laser_source']["CRP_high"],
                  user_dict['limit']['laser_source']["CRP_low"],
                  user_dict['limit']['laser_source']["limit_name"])
+    if not checkpointed:
+        journal.record_crp(crp_power)  # only a CRP within the limits is resumed
 
 
 def tosa_path_los(bay: int):
@@ -213,6 +356,11 @@ def tosa_path_los(bay: int):
                  user_dict['limit']['path_loss']["loss_high"],
                  user_dict['limit']['path_loss']["loss_low"],
                  user_dict['limit']['path_loss']["limit_name"])
+    if not journal.is_measured(bay):
+        journal.record_bay(bay, {'WLM_Bay_RAW': user_dict[f'WLM_Bay_RAW{bay:02d}(dB)'],
+                                 'OPM_Bay_RAW': user_dict[f'OPM_Bay_RAW{bay:02d}(dB)'],
+                                 'WLM_freq(THz)': user_dict.get(f'WLM_freq_Bay{bay:02d}(THz)'),
+                                 'WLM_SMSR': user_dict.get(f'WLM_SMSR_Bay{bay:02d}')})
     # print(f"CRP: {user_dict['CRP(dB)']}")
     # print(f"OPM_Bay {bay} {user_dict[f'OPM_Bay{bay:02d}(dB)']}")
     # print(f"TPL {bay}: {user_dict[f'TPL {bay}']}")
@@ -265,43 +413,83 @@ def old_data(filename):
     return df, index_last
 
 
+store = None
+
+
+def get_store(filename=None) -> CalibrationStore:
+    """
+    Calibration history store, the legacy fixed-width file is imported on first use
+    :param filename: Legacy fixed-width calibration file
+    :return:
+    """
+    global store
+    if store is None:
+        store = CalibrationStore(Pl_DB, patch_character(), legacy_file=filename)
+    return store
+
+
+chart = None
+
+
+def get_chart(filename=None) -> ControlChart:
+    """
+    Control chart series of the calibration history, updated incrementally
+    :param filename: Legacy fixed-width calibration file
+    :return:
+    """
+    global chart
+    if chart is None:
+        chart = ControlChart(get_store(filename), Pl_CHART_CACHE)
+    return chart
+
+
 def collect_data(filename):
     if user_dict['fail']:
         logging.error("Skip Collect Data: Fail in sequence")
         return False
-    if filename is not Path:
-        filename = Path(filename)
-
-    if filename is not Path:
-        filename = Path(filename)
+    user_dict["Iteration(#)"] = get_store(filename).append(user_dict)
+    logging.info(f"Store iteration {user_dict['Iteration(#)']}: {Pl_DB}")
+    journal.clear()
+    # the run is stored: a failing SPC analysis must not fail the step
     try:
-        df_old = pd.read_fwf(filename)
-        index_last = df_old.iloc[-1]["Iteration(#)"]
+        check_spc(filename)
     except Exception as e:
-        logging.error(e)
-        raw = tabulate([], list(patch_character()), tablefmt="plain")
-        open(filename.as_posix(), "w").write(raw)
-        index_last = 0
-        df_old = None
-    col_char = patch_character()
-    user_dict["Iteration(#)"] = index_last + 1
-    df = pd.DataFrame(data=user_dict, columns=col_char, index=[user_dict["Iteration(#)"]])
-    df.fillna(0, inplace=True)
-    if df_old is not None:
-        last_df = pd.concat([df_old, df], ignore_index=True)
-    else:
-        last_df = df
-    value_list = last_df.values.tolist()
-    content = tabulate(value_list, list(last_df.columns), tablefmt="plain")
-    open(filename.as_posix(), "w").write(content)
-    logging.info(f"Write file: {filename}")
+        logging.error(f"SPC of the path loss history failed: {e}")
+        user_dict.pop('spc', None)
+
+
+def check_spc(filename):
+    """
+    Statistical process control of the path loss history, flagged bays are logged and kept in user_dict['spc']
+    :param filename: Legacy fixed-width calibration file
+    :return:
+    """
+    control_chart = get_chart(filename)
+    control_chart.update()
+    result = analyze(control_chart.values,
+                     loss_low=user_dict['limit']['path_loss']['loss_low'],
+                     loss_high=user_dict['limit']['path_loss']['loss_high'])
+    user_dict['spc'] = log_flags(result, user_dict['Bay_Available'])
+    return user_dict['spc']
+
+
+def export_data(filename):
+    """
+    Write the calibration history to the legacy fixed-width file
+    :param filename: Legacy fixed-width calibration file
+    :return:
+    """
+    get_store(filename).export_fwf(filename)
 
 
 def plot_by_data(bay, pl_file, pl_folder):
     if user_dict['fail']:
         logging.error("Skip Plot: Fail in sequence")
         return False
-    plot_control_chart(bay, pl_file=pl_file, file_c=pl_folder.joinpath(f"{user_dict['Datetime(#)']}.png"))
+    control_chart = get_chart(pl_file)
+    control_chart.update()
+    control_chart.render(bay, file_c=pl_folder.joinpath(f"{user_dict['Datetime(#)']}.png"),
+                         flags=user_dict.get('spc'))
 
 
 def load_limit():
@@ -314,6 +502,21 @@ def load_limit():
     return user_dict['limit']
 
 
+def log_settle_stats():
+    """
+    Log the settle time distribution of the optical switch channels in this run, kept in user_dict['osw_settle']
+    :return:
+    """
+    stats = case.osw.get_settle_stats()
+    for channel, channel_stats in sorted(stats.items()):
+        logging.info(f"OSW channel {channel} settle time over {channel_stats['count']} switchings: "
+                     f"mean {channel_stats['mean'] * 1e3:.1f} ms, min {channel_stats['min'] * 1e3:.1f} ms, "
+                     f"p95 {channel_stats['p95'] * 1e3:.1f} ms, max {channel_stats['max'] * 1e3:.1f} ms")
+    user_dict['osw_settle'] = stats
+    case.osw.clear_settle_stats()
+    return stats
+
+
 def power_laser_check(tolerance):
     crp_power = case.opm_get_pwr()
     user_dict['CRP(dB)_end'] = crp_power
@@ -0,0 +1,133 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+PREVIOUS_STEP = None  # default for depends: run after the previously added step
+
+
+class SequenceStep:
+    def __init__(self, index: int, func, name: str, kwargs: dict = None, depends=PREVIOUS_STEP, resources=(),
+                 skip=None):
+        self.index = index
+        self.func = func
+        self.name = name
+        self.kwargs = kwargs
+        if depends is PREVIOUS_STEP:
+            depends = [index - 1] if index > 0 else []
+        self.depends = sorted(set(depends))
+        self.resources = frozenset(resources)
+        self.skip = skip
+
+    def __repr__(self):
+        return f"SequenceStep({self.index}, {self.name})"
+
+    def run(self):
+        if self.kwargs is None:
+            return self.func()
+        return self.func(**self.kwargs)
+
+
+class SequenceEngine:
+    """
+    Runs sequence steps as a dependency graph.
+
+    Every step declares the steps it depends on and the resources it needs (e.g. 'OPM', 'WLM',
+    'OSW', 'operator'). A step is started once all its dependencies have finished and none of
+    its resources is held by a running step, so independent steps run concurrently while steps
+    sharing an instrument or the operator are serialized. Without explicit dependencies a step
+    depends on the previously added one, which keeps the strict ordering of a plain list.
+
+    A step is reported as failed if it raised or if any of its dependencies was reported failed.
+    Failed dependencies do not stop a step from running, the same as the original step list.
+    A step whose skip callable returns True when it becomes ready is not run and reported passed.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.steps = []
+        self.max_workers = max_workers
+
+    def __len__(self):
+        return len(self.steps)
+
+    @property
+    def names(self) -> list:
+        return [step.name for step in self.steps]
+
+    def add_step(self, func, name: str, kwargs: dict = None, depends=PREVIOUS_STEP, resources=(),
+                 skip=None) -> int:
+        """
+        Register a sequence step
+        :param func: Function to run
+        :param name: Step name shown on the GUI
+        :param kwargs: Keyword arguments for func
+        :param depends: Indexes of steps that must finish first. Default: the previously added step
+        :param resources: Names of the resources used exclusively by the step
+        :param skip: Optional callable, evaluated when the step is ready, returning True to skip it
+        :return: Index of the step, used as dependency by later steps
+        """
+        index = len(self.steps)
+        step = SequenceStep(index, func, name, kwargs=kwargs, depends=depends, resources=resources, skip=skip)
+        for dep in step.depends:
+            if not 0 <= dep < index:
+                raise ValueError(f"Step '{name}' depends on unknown step {dep}")
+        self.steps.append(step)
+        return index
+
+    def run(self, abort=None, on_start=None, on_finish=None) -> list:
+        """
+        Run all steps
+        :param abort: Callable returning True to stop starting new steps. Remaining steps are reported failed
+        :param on_start: Callable(index) called when a step starts
+        :param on_finish: Callable(index, passed) called when a step is finished or skipped
+        :return: List of pass/fail results in step order
+        """
+        results = [None] * len(self.steps)
+        pending = list(self.steps)
+        running = {}
+        busy = set()
+
+        def finish(step, passed):
+            passed = passed and all(results[dep] for dep in step.depends)
+            results[step.index] = passed
+            if on_finish is not None:
+                on_finish(step.index, passed)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                if abort is not None and abort():
+                    for step in pending:
+                        finish(step, False)
+                    pending = []
+                for step in list(pending):
+                    if len(running) >= self.max_workers:
+                        break
+                    if any(results[dep] is None for dep in step.depends):
+                        continue
+                    if step.skip is not None and step.skip():
+                        pending.remove(step)
+                        logging.info(f"Skip step: {step.name}")
+                        finish(step, True)
+                        continue
+                    if step.resources & busy:
+                        continue
+                    pending.remove(step)
+                    busy |= step.resources
+                    if on_start is not None:
+                        on_start(step.index)
+                    running[pool.submit(step.run)] = step
+                if not running:
+                    if pending:
+                        raise RuntimeError(f"Sequence deadlock, no runnable step in {pending}")
+                    break
+
+                done, _ = wait(running, timeout=0.1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    step = running.pop(future)
+                    busy -= step.resources
+                    try:
+                        future.result()
+                        passed = True
+                    except Exception as e:
+                        logging.error(f"{step.name}: {e}")
+                        passed = False
+                    finish(step, passed)
+        return results
@@ -0,0 +1,142 @@
+import logging
+import warnings
+
+import numpy as np
+
+D2 = 1.128  # d2 constant of a moving range of 2 points
+
+
+def _compact(values: np.ndarray) -> np.ndarray:
+    """ Move the missing points (NaN) of every column to the top, keeping the order of the measured points """
+    order = np.argsort(~np.isnan(values), axis=0, kind='stable')
+    return np.take_along_axis(values, order, axis=0)
+
+
+def _count_tail(flags: np.ndarray, length: int) -> np.ndarray:
+    return flags[-length:].sum(axis=0) if len(flags) >= length else np.zeros(flags.shape[1], dtype=int)
+
+
+class SpcResult:
+    """
+    SPC statistics of every bay (arrays indexed by bay - 1) and the rules raised by the last point
+    """
+
+    def __init__(self, count, mean, sigma, last, ewma, cusum_pos, cusum_neg, slope, projected, rules):
+        self.count = count
+        self.mean = mean
+        self.sigma = sigma
+        self.last = last
+        self.ewma = ewma
+        self.cusum_pos = cusum_pos
+        self.cusum_neg = cusum_neg
+        self.slope = slope
+        self.projected = projected
+        self.rules = rules
+
+    def flags(self, bays=None) -> dict:
+        """
+        :param bays: Bay numbers to report, default all
+        :return: {bay: [rule names]} of the bays with at least one raised rule
+        """
+        if bays is None:
+            bays = range(1, len(self.count) + 1)
+        flags = {}
+        for bay in bays:
+            raised = [name for name, rule in self.rules.items() if rule[bay - 1]]
+            if raised:
+                flags[bay] = raised
+        return flags
+
+    def describe(self, bay: int) -> str:
+        i = bay - 1
+        return (f"Bay #{bay:02d}: n={self.count[i]} mean={self.mean[i]:.3f} sigma={self.sigma[i]:.3f} "
+                f"last={self.last[i]:.3f} EWMA={self.ewma[i]:.3f} CUSUM=+{self.cusum_pos[i]:.2f}/"
+                f"-{self.cusum_neg[i]:.2f} projected={self.projected[i]:.3f}")
+
+
+def analyze(values: np.ndarray, loss_low: float, loss_high: float, ewma_lambda: float = 0.2,
+            cusum_k: float = 0.5, cusum_h: float = 5.0, guard: float = 0.5, trend_window: int = 10,
+            horizon: int = 10, min_points: int = 8) -> SpcResult:
+    """
+    Vectorized SPC of the path loss history of all bays at once
+    :param values: (iterations x bays) path loss matrix, 0 or NaN for a bay not measured in an iteration
+    :param loss_low: Low path loss limit (dB)
+    :param loss_high: High path loss limit (dB)
+    :param ewma_lambda: EWMA smoothing weight
+    :param cusum_k: CUSUM allowance, in sigma
+    :param cusum_h: CUSUM decision interval, in sigma
+    :param guard: Distance to a limit (dB) at which the EWMA or the projected trend is flagged
+    :param trend_window: Number of last points of the linear trend
+    :param horizon: Number of iterations ahead of the trend projection
+    :param min_points: Minimum number of measured points of a bay to evaluate the rules
+    :return: SpcResult
+    """
+    values = np.array(values, dtype=np.float64, ndmin=2)
+    values[values == 0] = np.nan
+    values = _compact(values)
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=0)
+    enough = count >= min_points
+
+    with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+        # bays without data: 'Mean of empty slice'
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        mean = np.nanmean(values, axis=0)
+        moving_range = np.abs(np.diff(values, axis=0))
+        sigma = np.nanmean(moving_range, axis=0) / D2
+        sigma[~(sigma > 0)] = np.nan
+        z = (values - mean) / sigma
+
+        # EWMA and CUSUM recursions over the iterations, vectorized across bays
+        ewma = np.full(values.shape[1], np.nan)
+        cusum_pos = np.zeros(values.shape[1])
+        cusum_neg = np.zeros(values.shape[1])
+        for row, z_row in zip(values, z):
+            measured = ~np.isnan(row)
+            ewma = np.where(measured, np.where(np.isnan(ewma), row, ewma_lambda * row + (1 - ewma_lambda) * ewma),
+                            ewma)
+            z_row = np.nan_to_num(z_row)
+            cusum_pos = np.where(measured, np.maximum(0, cusum_pos + z_row - cusum_k), cusum_pos)
+            cusum_neg = np.where(measured, np.maximum(0, cusum_neg - z_row - cusum_k), cusum_neg)
+        ewma_sigma = sigma * np.sqrt(ewma_lambda / (2 - ewma_lambda))
+
+        # Least squares trend of the last points, projected ahead
+        tail = values[-trend_window:]
+        x = np.arange(len(tail), dtype=np.float64)[:, None] * np.ones(tail.shape)
+        x[np.isnan(tail)] = np.nan
+        x_mean = np.nanmean(x, axis=0)
+        y_mean = np.nanmean(tail, axis=0)
+        slope = np.nansum((x - x_mean) * (tail - y_mean), axis=0) / np.nansum((x - x_mean) ** 2, axis=0)
+        last = values[-1]
+        projected = last + slope * horizon
+
+        # Western Electric rules on the last points
+        z = np.nan_to_num(z)
+        rules = {
+            'WE1': np.abs(z[-1]) > 3,
+            'WE2': (_count_tail(z > 2, 3) >= 2) | (_count_tail(z < -2, 3) >= 2),
+            'WE3': (_count_tail(z > 1, 5) >= 4) | (_count_tail(z < -1, 5) >= 4),
+            'WE4': (_count_tail(z > 0, 8) == 8) | (_count_tail(z < 0, 8) == 8),
+            'EWMA': np.abs(ewma - mean) > 3 * ewma_sigma,
+            'CUSUM': (cusum_pos > cusum_h) | (cusum_neg > cusum_h),
+            'NEAR_LIMIT': (ewma > loss_high - guard) | (ewma < loss_low + guard),
+            'TREND': (projected > loss_high - guard) | (projected < loss_low + guard),
+        }
+    for name in rules:
+        rules[name] = rules[name] & enough
+    return SpcResult(count, mean, sigma, last, ewma, cusum_pos, cusum_neg, slope, projected, rules)
+
+
+def log_flags(result: SpcResult, bays) -> dict:
+    """
+    Log the bays raising SPC rules
+    :param result: SpcResult
+    :param bays: Bay numbers to report
+    :return: {bay: [rule names]}
+    """
+    flags = result.flags(bays)
+    for bay, raised in flags.items():
+        logging.warning(f"SPC {', '.join(raised)}: {result.describe(bay)}")
+    if not flags:
+        logging.info("SPC: no rule raised")
+    return flags
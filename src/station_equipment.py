@@ -1,4 +1,6 @@
+import atexit
 import logging
+import threading
 import time
 from datetime import datetime
 from pathlib import Path
@@ -15,12 +17,14 @@ from gui_externals.instruments_api.interfaces.visa_interface import VISAInterfac
 from gui_externals.instruments_api.interfaces.web_interface import WebInterface
 from gui_externals.instruments_api.optical.opm.keysight_opm import Pwm
 from gui_externals.instruments_api.optical.osa.finisar_waveanalyzer import Osa
+from gui_externals.instruments_api.optical.switch.abs_switch import InstrErrorSwitch
 from gui_externals.instruments_api.optical.switch.santec_switch import Switch
 from gui_externals.instruments_api.optical.voa.keysight_voa import Voa
 from gui_externals.instruments_api.optical.wave_meter.bristol_wm import BristolWM
 
-from src.initialise_station_configs import LOCK_C_FOLDER, INSTR_YAML_CONFIG, LOCK_C_LOGFILE
+from src.initialise_station_configs import LOCK_C_FOLDER, INSTR_YAML_CONFIG, LOCK_C_LOGFILE, Pl_DB, STATION_NAME
 from src.common_functions import load_yaml_file
+from src.calibration_store import get_latest_offsets
 
 
 class OpticalInstruments:
@@ -47,22 +51,27 @@ class OpticalInstruments:
         if self._instr_cfg is None:
             self.load_settings_file()
 
-        eq_start_time = time.time()
         # Load instrument classes
-        # TODO: Need to make the bristol WLM use READ not MEAS to increase speed
+        self._setup_wlm()
+        self._setup_opm()
+        self._setup_osw()
+
+    def _setup_wlm(self):
+        eq_start_time = time.time()
+        # BristolWM.get_snapshot() reads frequency, power and SMSR from one READ scan
         self.wlm = BristolWM(interface=TelnetInterface(ip=self._instr_cfg['wlm']['addr']))
                              # skip_msg=self._instr_cfg['wlm']['skip_msg'])
         # self.wlm = BristolWM(interface=SocketInterface(ip=self._instr_cfg['wlm']['addr'],
         #                                                port=self._instr_cfg['wlm']['port']))
         if self._instr_cfg['wlm']['controller'] == 'SocketInterface':
-            self.wlm._interface.read()  # Use only for socket interface
+            self.wlm._interface.read_banner()  # Use only for socket interface
 
-        # TODO: Cleanup and reorder set configs, etc. Maybe separate function?
         if self._set_configs_flag:
-            self.wlm.set_cfg(**self._instr_cfg['wlm']['config'])
-            self.wlm.set_smsr_mode('1')
+            # one batched configuration message, SMSR mode 1 is required by the SMSR readings
+            self.wlm.set_cfg(**{**self._instr_cfg['wlm']['config'], 'smsr_mode': '1'})
         logging.debug(f'Bristol WLM, {self.wlm.get_idn()}, connection time: {time.time() - eq_start_time:.2f}s')
 
+    def _setup_opm(self):
         # if DEBUG_FLAG:
         #     eq_start_time = time.time()
         #     self.opm = Voa(interface=VISAInterface(address=self._instr_cfg['voa']['addr'], logger_name='Keysight_VOA'),
@@ -79,11 +88,12 @@ class OpticalInstruments:
         self.opm = Pwm(interface=VISAInterface(address=self._instr_cfg['opm']['addr']),
                        channel=self._instr_cfg['opm']['config']['channel'])
         if self._set_configs_flag:
-            temp_config = self._instr_cfg['opm']['config']
+            temp_config = dict(self._instr_cfg['opm']['config'])
             temp_config.pop('channel')
             self.opm.set_config(temp_config)
         logging.debug(f'Keysight OPM, {self.opm.idn},  connection time: {time.time() - eq_start_time:.2}s')
 
+    def _setup_osw(self):
         eq_start_time = time.time()
         self.osw = Switch(VISAInterface(address=self._instr_cfg['osw']['addr'], logger_name='Santec_OSW'))
         # if self._set_configs_flag:
@@ -164,21 +174,100 @@ class OpticalInstruments:
         return out_dict
 
 
+class InstrumentSessionPool:
+    """
+    Process-wide pool of the connected WLM, OPM and switch drivers.
+
+    The drivers are kept open between optical lock holders of this process. On lock entry every
+    pooled driver is health-checked with an identification query and only the failing ones are
+    reconnected (and configured if requested), instead of opening and configuring new sessions
+    for every lock. The optical lock is shared between processes but the pool is not: enable it
+    (session_pool: True in the instrument config) only on stations where a single process uses
+    the instruments, since the WLM telnet server accepts one client at a time.
+    """
+    DRIVERS = ('wlm', 'opm', 'osw')
+
+    def __init__(self):
+        self._drivers = {}
+        self._configured = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _is_healthy(name: str, driver) -> bool:
+        try:
+            if name == 'wlm':
+                idn = driver.get_idn()
+            elif name == 'opm':
+                idn = driver.idn
+            else:
+                idn = driver.idn()
+        except Exception as e:
+            logging.warning(f'Pooled {name.upper()} session failed health check: {e}')
+            return False
+        return bool(idn)
+
+    def acquire(self, instruments: OpticalInstruments):
+        """ Hand the pooled drivers to instruments, reconnecting the missing or failing ones """
+        if instruments._instr_cfg is None:
+            instruments.load_settings_file()
+        with self._lock:
+            for name in self.DRIVERS:
+                driver = self._drivers.get(name)
+                need_config = instruments._set_configs_flag and name not in self._configured
+                if driver is not None and not need_config and self._is_healthy(name, driver):
+                    setattr(instruments, name, driver)
+                    continue
+                self._close_driver(name)
+                getattr(instruments, f'_setup_{name}')()
+                self._drivers[name] = getattr(instruments, name)
+                if instruments._set_configs_flag:
+                    self._configured.add(name)
+
+    def release(self, instruments: OpticalInstruments):
+        """ Take the drivers back from instruments, keeping the sessions open """
+        for name in self.DRIVERS:
+            setattr(instruments, name, None)
+
+    def _close_driver(self, name: str):
+        driver = self._drivers.pop(name, None)
+        self._configured.discard(name)
+        if driver is None:
+            return
+        try:
+            interface = driver._interface
+            if hasattr(interface, 'disconnect'):
+                interface.disconnect()
+            else:
+                interface.close()
+        except Exception as e:
+            logging.warning(e, exc_info=True)
+
+    def close(self):
+        """ Close all pooled sessions """
+        with self._lock:
+            for name in list(self._drivers):
+                self._close_driver(name)
+
+
+session_pool = InstrumentSessionPool()
+atexit.register(session_pool.close)
+
+
 class OpticalInstrumentsLock(ILock, OpticalInstruments):
 
     def __init__(self, tosa_snr: str = 'Unknown', tosa_bay: int = np.nan, set_configs: bool = False, timeout=None,
-                 check_interval=1.00):
+                 check_interval=1.00, use_cal_offsets: bool = False):
         super().__init__(name='Optical_lock', lock_directory=LOCK_C_FOLDER.as_posix(), timeout=timeout,
                          check_interval=check_interval, reentrant=False)
         # Load optical calibration values
         tosa_bay = int(tosa_bay)
-        # # optical_cal_values = pd.read_fwf(OPTICAL_CAL_CONFIG)
-        # if type(tosa_bay) in [int, float] and tosa_bay in list(range(1, 71)):
-        #     wlm_offset = optical_cal_values[f'WLM_Bay{tosa_bay:02d}(dB)'].to_list()[-1]
-        #     opm_offset = optical_cal_values[f'OPM_Bay{tosa_bay:02d}(dB)'].to_list()[-1]
-        # else:
-        wlm_offset = 0
-        opm_offset = 0
+        if use_cal_offsets and tosa_bay in range(1, 71):
+            # Latest offsets of this station, cached until the calibration store changes
+            wlm_offset, opm_offset = get_latest_offsets(Pl_DB).get(STATION_NAME, tosa_bay)
+            logging.debug(f'Bay #{tosa_bay:02d} calibration offsets: WLM {wlm_offset} dB, OPM {opm_offset} dB')
+        else:
+            wlm_offset = 0
+            opm_offset = 0
         OpticalInstruments.__init__(self, wlm_offset=wlm_offset, opm_offset=opm_offset, set_configs=set_configs)
 
         self.tosa_snr = tosa_snr
@@ -212,16 +301,18 @@ class OpticalInstrumentsLock(ILock, OpticalInstruments):
 
                 logging.debug(f'Optical lock obtained by {self.tosa_snr} in bay #{self.tosa_bay:02d}')
                 self._enter_count = 1
-                self.setup_instruments()
+                if self._use_session_pool():
+                    session_pool.acquire(self)
+                else:
+                    self.setup_instruments()
                 if self.osw is not None:
                     if not np.isnan(self.tosa_bay):
                         logging.debug(f'Setting optical switch to Bay #{self.tosa_bay:02d}')
-                        self.osw.set_channel(self.tosa_bay)
-                        self.osw.opc_wait()
-                        start_time = time.time()
-                        while self.osw.get_channel() != self.tosa_bay and abs(time.time() - start_time) < 5:
-                            time.sleep(0.1)
-                        time.sleep(0.2)
+                        try:
+                            settle_time = self.osw.set_channel_settled(self.tosa_bay, timeout=5)
+                            logging.debug(f'Optical switch settled in {settle_time:.3f}s')
+                        except InstrErrorSwitch as e:
+                            logging.warning(e)
                     else:
                         logging.warning(f'TOSA is in Bay #{self.tosa_bay:02d}. Optical switch was not set.')
                 return self
@@ -247,5 +338,13 @@ class OpticalInstrumentsLock(ILock, OpticalInstruments):
             f'[{datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}] Exited by {self.tosa_snr} in bay #{self.tosa_bay:02d}\n')
         lock_log.close()
 
-        # Close wlm and switch sections
-        self.close_instruments()
+        # Close wlm and switch sections, or leave them open in the session pool
+        if self._use_session_pool():
+            session_pool.release(self)
+        else:
+            self.close_instruments()
+
+    def _use_session_pool(self) -> bool:
+        if self._instr_cfg is None:
+            self.load_settings_file()
+        return bool(self._instr_cfg.get('session_pool', False))